@@ -1,5 +1,8 @@
 from celery import Celery
+from celery.signals import after_setup_logger, task_postrun, worker_process_init, worker_process_shutdown
 from app.config import settings
+from app.database import TaskSession, get_engine
+from app.logging_config import restart_logging_listener, setup_logging
 
 # Create Celery app
 celery_app = Celery(
@@ -11,9 +14,11 @@ celery_app = Celery(
 
 # Configure Celery
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # msgpack keeps large text/embedding payloads compact; json is still
+    # accepted so tasks queued by older producers keep working
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+    result_serializer='msgpack',
     timezone='UTC',
     enable_utc=True,
     task_track_started=True,
@@ -21,8 +26,49 @@ celery_app.conf.update(
         'app.tasks.process_document_task': {'queue': 'document_processing'},
         'app.tasks.generate_summary_task': {'queue': 'ai_processing'},
         'app.tasks.generate_embeddings_task': {'queue': 'ai_processing'},
+        # Maintenance tasks are DB/disk work; nothing consumes the default 'celery' queue
+        'app.tasks.cleanup_failed_documents': {'queue': 'document_processing'},
+        'app.tasks.cleanup_failed_documents_batch': {'queue': 'document_processing'},
+        'app.tasks.update_document_stats': {'queue': 'document_processing'},
     },
+    # Safe default for the CPU/disk-bound document_processing queue. Workers
+    # for the I/O-bound ai_processing queue override this on the command line
+    # (see Procfile); prefetch is counted per worker process.
     worker_prefetch_multiplier=1,
     task_acks_late=True,
     worker_max_tasks_per_child=1000,
 )
+
+@after_setup_logger.connect
+def queue_worker_logging(**kwargs):
+    """Put Celery's root handlers behind a queue once Celery has installed them"""
+    # Celery has already applied --loglevel to the root logger
+    setup_logging(level=None)
+
+@worker_process_init.connect
+def restart_log_listener(**kwargs):
+    """Forked pool processes inherit the queue handler but not the listener thread"""
+    restart_logging_listener()
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Drop pooled connections inherited from the parent so forked workers never share a socket"""
+    get_engine().dispose(close=False)
+
+@task_postrun.connect
+def remove_task_session(**kwargs):
+    """Close the task's session, returning its connection to this worker's pool"""
+    TaskSession.remove()
+
+@worker_process_init.connect
+def warm_ai_service(**kwargs):
+    """Load the AI models when a worker process starts so the first task doesn't pay for it"""
+    from app.services.ai_service import get_ai_service
+    get_ai_service()
+
+@worker_process_shutdown.connect
+def close_storage_client(**kwargs):
+    """Close the S3 client on the event loop that opened it"""
+    from app.services.storage_service import get_storage_service
+    from app.tasks import run_async
+    run_async(get_storage_service().close())
@@ -1,6 +1,8 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache
 from typing import Optional
 import os
+import tempfile
 
 class Settings(BaseSettings):
     # Database
@@ -12,6 +14,11 @@ class Settings(BaseSettings):
     # Groq
     groq_api_key: str = ""
     
+    # Embeddings (directory of an int8-quantized ONNX export of all-MiniLM-L6-v2; empty uses PyTorch)
+    embedding_onnx_model_path: str = ""
+    embed_batch_size: int = 32  # Chunks per embedding call; halved automatically on out-of-memory
+    embed_token_budget: int = 8192  # Max padded tokens (chunks x longest chunk) per embedding call
+    
     # Pinecone
     pinecone_api_key: str = ""
     pinecone_environment: str = "us-east1-gcp"
@@ -27,6 +34,9 @@ class Settings(BaseSettings):
     max_file_size: int = 50 * 1024 * 1024  # 50MB
     allowed_file_types: list = ["application/pdf"]
     upload_dir: str = "uploads"
+    pdf_cache_dir: str = os.path.join(tempfile.gettempdir(), "pdfcache")  # Extracted text keyed by content hash
+    pdf_cache_max_bytes: int = 512 * 1024 * 1024  # Least recently used entries are pruned beyond this
+    pdf_cache_max_age: int = 7 * 24 * 60 * 60  # Seconds an entry may go unused before it is pruned
     
     # Celery
     celery_broker_url: str = "redis://localhost:6379"
@@ -41,15 +51,10 @@ class Settings(BaseSettings):
     environment: str = "development"
     debug: bool = True
     
-    class Config:
-        env_file = "../.env"
-        case_sensitive = False
-
-# Create settings instance
-settings = Settings()
+    model_config = SettingsConfigDict(env_file="../.env", case_sensitive=False, frozen=True)
 
 # Validate required settings
-def validate_settings():
+def validate_settings(settings: Settings):
     """Validate that required settings are present"""
     required_for_ai = ["groq_api_key"]
     missing = [key for key in required_for_ai if not getattr(settings, key)]
@@ -57,5 +62,16 @@ def validate_settings():
     if missing and settings.environment == "production":
         raise ValueError(f"Missing required settings: {', '.join(missing)}")
 
-# Call validation
-validate_settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load and validate settings once, on first use"""
+    settings = Settings()
+    validate_settings(settings)
+    return settings
+
+def __getattr__(name: str):
+    # Keep `from app.config import settings` working without reading the
+    # environment / .env when the module is merely imported
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
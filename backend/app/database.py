@@ -1,18 +1,38 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from app.config import settings
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from functools import lru_cache
+from app.config import get_settings
+import orjson
 
-# Create database engine
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.debug
-)
+def _json_serializer(value) -> str:
+    """Serialize JSON columns with orjson; numpy arrays are encoded natively"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """Create the database engine on first use, so importing this module doesn't load settings"""
+    settings = get_settings()
+    return create_engine(
+        settings.database_url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        echo=settings.debug,
+        # JSON columns (key points, embedding metadata) go through orjson instead of json
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads
+    )
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+def SessionLocal() -> Session:
+    """New session bound to the (lazily created) engine"""
+    return _session_factory(bind=get_engine())
+
+# Per-thread session reused by Celery tasks; released after each task by the
+# task_postrun handler in celery_app
+TaskSession = scoped_session(SessionLocal)
 
 # Create base class for models
 Base = declarative_base()
@@ -27,4 +47,10 @@ def get_db():
 
 def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+
+def __getattr__(name: str):
+    # Keep `from app.database import engine` working; the engine is still built on first use
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
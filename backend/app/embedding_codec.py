@@ -0,0 +1,21 @@
+"""
+int8 encoding of stored embedding vectors.
+
+Only depends on numpy, so schema upgrades and tasks can encode vectors
+without loading the embedding model.
+"""
+from typing import Iterable, Tuple
+import numpy as np
+
+def quantize_embeddings(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization of an (N, D) matrix with one scale per row"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.max(np.abs(matrix), axis=1) / 127 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+    safe_scales = np.where(scales == 0, 1, scales)
+    return np.round(matrix / safe_scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def dequantize_embeddings(rows: Iterable[bytes], scales: Iterable[float]) -> np.ndarray:
+    """Recover a float32 (N, D) matrix from int8 row bytes and their scales in one pass"""
+    data = [bytes(row) for row in rows]
+    quantized = np.frombuffer(b"".join(data), dtype=np.int8).reshape(len(data), -1)
+    return quantized.astype(np.float32) * np.asarray(list(scales), dtype=np.float32)[:, None]
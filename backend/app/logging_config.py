@@ -0,0 +1,53 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: Optional[int] = logging.INFO) -> None:
+    """Route root logging through a queue so handler I/O runs on a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    if level is not None:
+        root.setLevel(level)
+
+    # Keep whatever handlers are already configured (e.g. Celery's), else log to stderr
+    handlers = root.handlers[:] or [logging.StreamHandler()]
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+def restart_logging_listener() -> None:
+    """Start a fresh listener thread in a forked child; the inherited one did not survive the fork"""
+    global _listener
+    if _listener is None:
+        return
+
+    # The inherited queue's lock may have been held by the parent's listener thread at fork time,
+    # so the root QueueHandler is pointed at a fresh queue served by a new listener
+    inherited, _listener = _listener, None
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is inherited.queue:
+            handler.queue = log_queue
+
+    _listener = logging.handlers.QueueListener(log_queue, *inherited.handlers, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener() -> None:
+    """Flush queued records on interpreter exit"""
+    if _listener is not None:
+        _listener.stop()
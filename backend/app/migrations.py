@@ -0,0 +1,120 @@
+"""
+In-place schema upgrades for databases created by older versions of the models.
+
+create_all only creates missing tables, so columns, column types and indexes
+added to existing tables are applied here. Every step checks the live schema
+first and is safe to run repeatedly. It runs at API startup, or manually:
+
+    python -m app.migrations
+"""
+from sqlalchemy import Float, JSON, LargeBinary, inspect, text
+from sqlalchemy.engine import Connection, Engine
+import logging
+import numpy as np
+import orjson
+
+from app.models import Base
+from app.embedding_codec import quantize_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Legacy embedding rows re-encoded per round trip
+EMBEDDING_BACKFILL_BATCH = 500
+
+def upgrade_schema(engine: Engine) -> None:
+    """Apply every pending upgrade, then create indexes that existing tables are missing"""
+    with engine.begin() as conn:
+        _add_embedding_metadata(conn)
+        _quantize_legacy_embeddings(conn)
+        _dedupe_summaries(conn)
+
+    with engine.begin() as conn:
+        _create_missing_indexes(conn)
+
+def _column_names(conn: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+def _add_embedding_metadata(conn: Connection):
+    """documents.embedding_metadata (JSON, nullable)"""
+    if "embedding_metadata" in _column_names(conn, "documents"):
+        return
+
+    logger.info("Adding documents.embedding_metadata")
+    json_type = JSON().compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE documents ADD COLUMN embedding_metadata {json_type}"))
+
+def _quantize_legacy_embeddings(conn: Connection):
+    """Re-encode JSON float embeddings as int8 bytes plus embedding_scale"""
+    if "embedding_scale" in _column_names(conn, "vector_embeddings"):
+        return
+
+    logger.info("Converting vector_embeddings.embedding from JSON floats to int8")
+    binary_type = LargeBinary().compile(dialect=conn.dialect)
+    float_type = Float().compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE vector_embeddings ADD COLUMN embedding_int8 {binary_type}"))
+    conn.execute(text(f"ALTER TABLE vector_embeddings ADD COLUMN embedding_scale {float_type}"))
+
+    # Keyset pagination so no more than one batch of legacy vectors is held at a time
+    select_batch = text(
+        "SELECT id, embedding FROM vector_embeddings WHERE id > :last_id ORDER BY id LIMIT :limit"
+    )
+    update_row = text(
+        "UPDATE vector_embeddings SET embedding_int8 = :data, embedding_scale = :scale WHERE id = :id"
+    )
+    last_id = ""
+    converted = 0
+    while rows := conn.execute(select_batch, {"last_id": last_id, "limit": EMBEDDING_BACKFILL_BATCH}).all():
+        # Drivers return JSON columns either parsed or as text
+        vectors = [orjson.loads(value) if isinstance(value, (str, bytes)) else value for _, value in rows]
+        quantized, scales = quantize_embeddings(np.asarray(vectors, dtype=np.float32))
+        conn.execute(update_row, [
+            {"id": row_id, "data": quantized[i].tobytes(), "scale": float(scales[i])}
+            for i, (row_id, _) in enumerate(rows)
+        ])
+        converted += len(rows)
+        last_id = rows[-1][0]
+
+    conn.execute(text("ALTER TABLE vector_embeddings DROP COLUMN embedding"))
+    conn.execute(text("ALTER TABLE vector_embeddings RENAME COLUMN embedding_int8 TO embedding"))
+    if conn.dialect.name == "postgresql":
+        # SQLite can't add NOT NULL to an existing column; the ORM always writes both values
+        conn.execute(text("ALTER TABLE vector_embeddings ALTER COLUMN embedding SET NOT NULL"))
+        conn.execute(text("ALTER TABLE vector_embeddings ALTER COLUMN embedding_scale SET NOT NULL"))
+
+    logger.info("Converted %d legacy embeddings", converted)
+
+def _dedupe_summaries(conn: Connection):
+    """Keep only the newest summary per document so the unique index on summaries.document_id can be built"""
+    if "ix_summaries_document_id" in {index["name"] for index in inspect(conn).get_indexes("summaries")}:
+        return
+
+    result = conn.execute(text(
+        "DELETE FROM summaries WHERE id NOT IN ("
+        " SELECT id FROM ("
+        "  SELECT id, ROW_NUMBER() OVER ("
+        "   PARTITION BY document_id ORDER BY created_at DESC, id DESC"
+        "  ) AS recency FROM summaries"
+        " ) ranked WHERE recency = 1"
+        ")"
+    ))
+    if result.rowcount:
+        logger.info("Removed %d duplicate summaries", result.rowcount)
+
+def _create_missing_indexes(conn: Connection):
+    """Indexes declared on the models but absent from tables that predate them"""
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            # Dialect-specific indexes (e.g. the PostgreSQL full-text index) are skipped elsewhere
+            ddl_if = getattr(index, "_ddl_if", None)
+            if ddl_if is not None and ddl_if.dialect not in (None, conn.dialect.name):
+                continue
+            if index.name not in existing:
+                logger.info("Creating index %s", index.name)
+                index.create(conn, checkfirst=True)
+
+if __name__ == "__main__":
+    from app.database import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    upgrade_schema(get_engine())
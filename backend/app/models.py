@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Float, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, DateTime, Text, Float, Boolean, ForeignKey, JSON, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, text
 import uuid
 
 Base = declarative_base()
@@ -17,17 +17,20 @@ class Document(Base):
     s3_key = Column(String, nullable=True)  # For S3 storage
     
     # Processing status
-    status = Column(String, default="uploading")  # uploading, processing, completed, error
+    status = Column(String, default="uploading", index=True)  # uploading, processing, completed, error
     processing_stage = Column(String, nullable=True)  # text-extraction, summarization, highlighting
     processing_progress = Column(Integer, default=0)
     error_message = Column(Text, nullable=True)
     
     # Document metadata
     page_count = Column(Integer, nullable=True)
-    text_content = Column(Text, nullable=True)
+    # Deferred so list/status queries don't pull the full text; loaded on first access
+    text_content = deferred(Column(Text, nullable=True))
+    # Chunking parameters of the stored embeddings, used to skip redundant re-embedding
+    embedding_metadata = Column(JSON, nullable=True)
     
     # Timestamps
-    uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     processed_at = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -35,11 +38,27 @@ class Document(Base):
     summaries = relationship("Summary", back_populates="document", cascade="all, delete-orphan")
     highlights = relationship("Highlight", back_populates="document", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Full-text index backing DocumentService.search_documents (PostgreSQL only)
+        Index(
+            "ix_documents_text_content_fts",
+            text("to_tsvector('english', text_content)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        # Small partial index for the hot "processing" state (PostgreSQL only; without
+        # the WHERE clause it would just duplicate the primary key)
+        Index(
+            "ix_documents_processing",
+            id,
+            postgresql_where=(status == "processing"),
+        ).ddl_if(dialect="postgresql"),
+    )
+
 class Summary(Base):
     __tablename__ = "summaries"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    document_id = Column(String, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, unique=True, index=True)
     
     # Summary content
     content = Column(Text, nullable=False)
@@ -50,7 +69,7 @@ class Summary(Base):
     model_used = Column(String, nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
@@ -80,19 +99,24 @@ class Highlight(Base):
     # Relationships
     document = relationship("Document", back_populates="highlights")
 
+    __table_args__ = (
+        Index("ix_highlights_document_id_page_number", document_id, page_number),
+    )
+
 class VectorEmbedding(Base):
     __tablename__ = "vector_embeddings"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    document_id = Column(String, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
     
     # Text chunk information
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     page_number = Column(Integer, nullable=True)
     
-    # Vector data (stored as JSON for PostgreSQL)
-    embedding = Column(JSON, nullable=False)
+    # Vector data (int8-quantized bytes; multiply by embedding_scale to recover float values)
+    embedding = Column(LargeBinary, nullable=False)
+    embedding_scale = Column(Float, nullable=False)
     
     # Metadata
     token_count = Column(Integer, nullable=True)
@@ -104,11 +128,11 @@ class ProcessingJob(Base):
     __tablename__ = "processing_jobs"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    document_id = Column(String, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
     
     # Job information
     job_type = Column(String, nullable=False)  # text_extraction, summarization, embedding
-    status = Column(String, default="pending")  # pending, running, completed, failed
+    status = Column(String, default="pending", index=True)  # pending, running, completed, failed
     
     # Progress tracking
     progress = Column(Integer, default=0)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Any, Generic, TypeVar
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional, Any, Generic, TypeVar
 from datetime import datetime
 
 T = TypeVar('T')
@@ -23,8 +23,7 @@ class DocumentBase(BaseModel):
     original_name: str = Field(alias="originalName")
     file_size: int = Field(alias="fileSize")
     
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 class DocumentCreate(DocumentBase):
     file_path: str
@@ -36,6 +35,8 @@ class DocumentUpdate(BaseModel):
     error_message: Optional[str] = None
     page_count: Optional[int] = None
     text_content: Optional[str] = None
+    s3_key: Optional[str] = None
+    embedding_metadata: Optional[Dict[str, Any]] = None
 
 class HighlightResponse(BaseModel):
     id: str
@@ -50,9 +51,7 @@ class HighlightResponse(BaseModel):
     confidence: Optional[float] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 class SummaryResponse(BaseModel):
     id: str
@@ -63,8 +62,7 @@ class SummaryResponse(BaseModel):
     model_used: Optional[str] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class DocumentResponse(DocumentBase):
     id: str
@@ -77,12 +75,7 @@ class DocumentResponse(DocumentBase):
     summary: Optional[SummaryResponse] = None
     highlights: List[HighlightResponse] = []
 
-    class Config:
-        from_attributes = True
-        populate_by_name = True
-        json_encoders = {
-            datetime: lambda v: v.isoformat() if v else None
-        }
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 # Summary schemas
 class SummaryCreate(BaseModel):
@@ -125,6 +118,20 @@ class SearchResult(BaseModel):
     matched_text: str
     page_number: Optional[int] = None
 
+class DocumentMatch(BaseModel):
+    # Always None on PostgreSQL: stemmed full-text matches have no literal offset
+    position: Optional[int] = Field(
+        default=None,
+        description="Character offset of the match in the document text (SQLite only; null on PostgreSQL)"
+    )
+    # Plain text around the match, without highlight markup
+    context: str
+    # 0-1; literal matches score 1.0, full-text matches use the normalized ts_rank
+    relevance_score: float
+
+class DocumentMatchResponse(BaseModel):
+    results: List[DocumentMatch]
+
 class SearchResponse(BaseModel):
     query: str
     results: List[SearchResult]
@@ -137,7 +144,8 @@ class EmbeddingCreate(BaseModel):
     chunk_text: str
     chunk_index: int
     page_number: Optional[int] = None
-    embedding: List[float]
+    embedding: bytes  # int8-quantized vector, see embedding_codec.quantize_embeddings
+    embedding_scale: float
     token_count: Optional[int] = None
 
 # Job schemas
@@ -158,5 +166,4 @@ class ProcessingJobResponse(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,20 +1,99 @@
-from groq import Groq
-from typing import Dict, List, Optional
+from groq import AsyncGroq
+import httpx
+from typing import Dict, List, Optional, Tuple
 import tiktoken
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as LangChainDocument
 from sentence_transformers import SentenceTransformer
 import numpy as np
+import asyncio
+import logging
+import re
+from functools import lru_cache
 
 from app.config import settings
+from app.embedding_codec import dequantize_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent Groq requests when summarizing chunks in parallel
+GROQ_MAX_CONCURRENCY = 8
+
+# Numbered ("1." / "1)") or bulleted ("-" / "•") list items in LLM key-point output
+# ([^\S\n] is any whitespace except newline; \s*$ also drops the \r of CRLF output)
+KEY_POINT_RE = re.compile(r'^[^\S\n]*(?:\d+[.)]|[-•])[^\S\n]*(.*?)\s*$', re.MULTILINE)
+
+# Keep-alive pool shared by all Groq requests in a process (one AIService per process)
+GROQ_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+# Documents up to this many tokens are summarized in a single request
+SHORT_TEXT_TOKEN_LIMIT = 3000
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    """Load the BPE ranks once per process and share them across AIService instances"""
+    return tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+class ONNXEmbeddingModel:
+    """Quantized ONNX export of all-MiniLM-L6-v2 exposing the SentenceTransformer.encode API"""
+
+    def __init__(self, model_path: str, max_seq_length: int = 256):
+        # Optional dependency, only needed when an ONNX model path is configured
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_path)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_seq_length = max_seq_length
+
+    def encode(
+        self, 
+        texts: List[str], 
+        batch_size: int = 32, 
+        convert_to_numpy: bool = True, 
+        normalize_embeddings: bool = False, 
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """Mean-pooled sentence embeddings, matching SentenceTransformer's output"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            token_embeddings = np.asarray(self.model(**inputs).last_hidden_state, dtype=np.float32)
+            
+            # Mean pooling over non-padding tokens
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(embeddings)
+        
+        embeddings = np.concatenate(batches) if batches else np.empty((0, 384), dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        
+        return embeddings
 
 class AIService:
     def __init__(self):
-        self.groq_client = Groq(api_key=settings.groq_api_key)
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")  # Keep for token counting
+        self.groq_client = AsyncGroq(
+            api_key=settings.groq_api_key,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=GROQ_HTTP_LIMITS,
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+        )
+        self.encoding = get_encoding()  # Keep for token counting
         
         # Initialize embedding model for semantic search
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        if settings.embedding_onnx_model_path:
+            self.embedding_model = ONNXEmbeddingModel(settings.embedding_onnx_model_path)
+        else:
+            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         
         # Initialize text splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -23,9 +102,24 @@ class AIService:
             length_function=len,
         )
 
+    async def warm_up(self):
+        """Open the pooled Groq connection (DNS, TLS, HTTP/2) before the first real request"""
+        if not settings.groq_api_key:
+            return
+        
+        try:
+            await self.groq_client.models.list()
+        except Exception as e:
+            logger.warning("Groq warm-up failed: %s", e)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into summarization chunks"""
+        return self.text_splitter.split_text(text)
+
     def count_tokens(self, text: str) -> int:
         """Count tokens in text"""
-        return len(self.encoding.encode(text))
+        # encode_ordinary skips the special-token scan; special tokens in documents are plain text here
+        return len(self.encoding.encode_ordinary(text))
 
     async def generate_summary(
         self, 
@@ -35,16 +129,18 @@ class AIService:
     ) -> Dict[str, any]:
         """Generate AI summary of document text"""
         
-        # Count tokens in input text
-        token_count = self.count_tokens(text)
+        # Only the short/long routing depends on this, so skip the tokenizer for
+        # text that is clearly short (~4 characters per token)
+        is_short = len(text) <= SHORT_TEXT_TOKEN_LIMIT * 4 or self.count_tokens(text) <= SHORT_TEXT_TOKEN_LIMIT
         
         try:
-            if token_count <= 3000:
+            if is_short:
                 # Short document - direct summarization
                 summary_result = await self._summarize_short_text(text, document_name, max_summary_length)
             else:
-                # Long document - chunk and summarize
-                summary_result = await self._summarize_long_text(text, document_name, max_summary_length)
+                # Long document - split once and summarize the chunks
+                chunks = self.split_text(text)
+                summary_result = await self._summarize_long_text(chunks, document_name, max_summary_length)
             
             # Extract key points
             key_points = await self._extract_key_points(text, summary_result["summary"])
@@ -78,7 +174,7 @@ class AIService:
         Summary:
         """
         
-        response = self.groq_client.chat.completions.create(
+        response = await self.groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an expert document summarizer. Provide clear, concise, and comprehensive summaries."},
@@ -98,37 +194,18 @@ class AIService:
 
     async def _summarize_long_text(
         self, 
-        text: str, 
+        chunks: List[str], 
         document_name: str, 
         max_length: int
     ) -> Dict[str, any]:
         """Summarize long text using chunking strategy"""
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
-        
-        # Summarize each chunk
-        chunk_summaries = []
-        for i, chunk in enumerate(chunks):
-            chunk_prompt = f"""
-            Summarize this section (part {i+1} of {len(chunks)}) of the document "{document_name}":
-            
-            {chunk}
-            
-            Provide a concise summary focusing on the main points:
-            """
-            
-            response = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": "You are an expert at summarizing document sections. Focus on key information and main ideas."},
-                    {"role": "user", "content": chunk_prompt}
-                ],
-                max_tokens=300,
-                temperature=0.3
-            )
-            
-            chunk_summaries.append(response.choices[0].message.content.strip())
+        # Summarize all chunks concurrently; gather preserves chunk order
+        semaphore = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+        chunk_summaries = await asyncio.gather(*[
+            self._summarize_chunk(chunk, i, len(chunks), document_name, semaphore)
+            for i, chunk in enumerate(chunks)
+        ])
         
         # Combine chunk summaries into final summary
         combined_summaries = "\n\n".join(chunk_summaries)
@@ -143,7 +220,7 @@ class AIService:
         Final Summary:
         """
         
-        response = self.groq_client.chat.completions.create(
+        response = await self.groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an expert at creating comprehensive summaries from multiple sections. Ensure coherence and completeness."},
@@ -162,6 +239,37 @@ class AIService:
             "chunks_processed": len(chunks)
         }
 
+    async def _summarize_chunk(
+        self, 
+        chunk: str, 
+        index: int, 
+        total_chunks: int, 
+        document_name: str, 
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """Summarize a single chunk of a long document"""
+        
+        chunk_prompt = f"""
+        Summarize this section (part {index+1} of {total_chunks}) of the document "{document_name}":
+        
+        {chunk}
+        
+        Provide a concise summary focusing on the main points:
+        """
+        
+        async with semaphore:
+            response = await self.groq_client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=[
+                    {"role": "system", "content": "You are an expert at summarizing document sections. Focus on key information and main ideas."},
+                    {"role": "user", "content": chunk_prompt}
+                ],
+                max_tokens=300,
+                temperature=0.3
+            )
+        
+        return response.choices[0].message.content.strip()
+
     async def _extract_key_points(self, original_text: str, summary: str) -> List[str]:
         """Extract key points from the document"""
         
@@ -177,7 +285,7 @@ class AIService:
         Key Points:
         """
         
-        response = self.groq_client.chat.completions.create(
+        response = await self.groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an expert at extracting key points from document summaries. Focus on the most important and actionable information."},
@@ -189,28 +297,29 @@ class AIService:
         
         key_points_text = response.choices[0].message.content.strip()
         
-        # Parse the numbered list into individual points
-        key_points = []
-        lines = key_points_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
-                # Remove numbering/bullets and clean up
-                point = line.split('.', 1)[-1].strip() if '.' in line else line[1:].strip()
-                if point:
-                    key_points.append(point)
-        
+        # Parse the numbered list into individual points in one pass
+        key_points = [point for point in KEY_POINT_RE.findall(key_points_text) if point]
         return key_points[:8]  # Limit to 8 points
 
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for text chunks using SentenceTransformers"""
+    async def generate_embeddings(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Generate L2-normalized float32 embeddings for text chunks using SentenceTransformers"""
         
         try:
-            # Generate embeddings using local model
-            embeddings = self.embedding_model.encode(texts)
-            return embeddings.tolist()
+            # Generate embeddings using local model; normalized vectors make cosine a plain dot product.
+            # Encoding runs in a thread so concurrent I/O (e.g. S3 uploads) keeps making progress.
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(None, lambda: self.embedding_model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            ))
+            return embeddings.astype(np.float32, copy=False)
             
+        except MemoryError:
+            # Propagated as-is so callers can retry with a smaller batch
+            raise
         except Exception as e:
             raise Exception(f"Embedding generation failed: {str(e)}")
 
@@ -222,35 +331,48 @@ class AIService:
     ) -> List[Dict]:
         """Perform semantic search using embeddings"""
         
+        if not document_embeddings:
+            return []
+        
         # Generate query embedding
         query_embedding = await self.generate_embeddings([query])
-        query_vector = query_embedding[0]
-        
-        # Calculate similarity scores (cosine similarity)
-        results = []
-        for doc_embedding in document_embeddings:
-            similarity = self._cosine_similarity(query_vector, doc_embedding["embedding"])
-            results.append({
-                **doc_embedding,
-                "similarity_score": similarity
-            })
-        
-        # Sort by similarity and return top results
-        results.sort(key=lambda x: x["similarity_score"], reverse=True)
-        return results[:top_k]
+        query_vector = np.asarray(query_embedding[0], dtype=np.float32)
+        
+        # Stack document embeddings into one (N, D) matrix so all scores come from a single matmul
+        matrix = self._embedding_matrix(document_embeddings)
+        scores = self._cosine_similarity(query_vector, matrix, np.linalg.norm(matrix, axis=1))
+        
+        # Select the top_k in O(N), then sort only those
+        if top_k < len(scores):
+            top_indices = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top_indices = np.arange(len(scores))
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return [
+            {**document_embeddings[i], "similarity_score": float(scores[i])}
+            for i in top_indices
+        ]
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        import math
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(a * a for a in vec1))
-        magnitude2 = math.sqrt(sum(a * a for a in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0
+    def _embedding_matrix(self, document_embeddings: List[Dict]) -> np.ndarray:
+        """Build a float32 (N, D) matrix from float or int8-quantized embeddings"""
+        if isinstance(document_embeddings[0]["embedding"], (bytes, bytearray, memoryview)):
+            # Dequantize the whole batch at once instead of per row
+            return dequantize_embeddings(
+                [doc["embedding"] for doc in document_embeddings],
+                [doc["embedding_scale"] for doc in document_embeddings]
+            )
         
-        return dot_product / (magnitude1 * magnitude2)
+        return np.asarray([doc["embedding"] for doc in document_embeddings], dtype=np.float32)
+
+    def _cosine_similarity(
+        self, 
+        query_vector: np.ndarray, 
+        matrix: np.ndarray, 
+        matrix_norms: np.ndarray
+    ) -> np.ndarray:
+        """Calculate cosine similarity between a query vector and each row of a matrix"""
+        # Small epsilon keeps zero vectors at a score of 0 instead of dividing by zero
+        return (matrix @ query_vector) / (matrix_norms * np.linalg.norm(query_vector) + 1e-12)
 
     async def extract_highlights(
         self, 
@@ -284,7 +406,7 @@ class AIService:
         - "confidence": confidence score (0.0-1.0)
         """
         
-        response = self.groq_client.chat.completions.create(
+        response = await self.groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": "You are an expert at identifying important passages in documents. Respond with valid JSON only."},
@@ -301,3 +423,8 @@ class AIService:
         except json.JSONDecodeError:
             # Fallback: return empty list if JSON parsing fails
             return []
+
+@lru_cache(maxsize=1)
+def get_ai_service() -> AIService:
+    """Return the process-wide AIService so the embedding model is loaded only once"""
+    return AIService()
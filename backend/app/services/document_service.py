@@ -1,16 +1,32 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
-from typing import List, Tuple, Optional
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, or_, desc, func, insert, select, union, update, delete
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Optional
 from pathlib import Path
+from itertools import islice
+import asyncio
+import logging
 import os
+import re
 
-from app.models import Document, Summary, Highlight
+from app.models import Document, Summary, Highlight, VectorEmbedding, ProcessingJob
 from app.schemas import DocumentCreate, DocumentUpdate
-from app.services.storage_service import StorageService
+from app.services.pdf_service import get_pdf_service
+from app.services.storage_service import get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT when storing embeddings
+EMBEDDING_INSERT_BATCH = 500
+
+# Separator between ts_headline fragments. A control character: clean_pdf_text collapses
+# \x1c-\x1f with other whitespace, so stored text_content never contains it
+FTS_FRAGMENT_DELIMITER = "\x1f"
 
 class DocumentService:
     def __init__(self):
-        self.storage_service = StorageService()
+        self.storage_service = get_storage_service()
+        self.pdf_service = get_pdf_service()
 
     async def create_document(self, db: Session, document_data: DocumentCreate) -> Document:
         """Create a new document record"""
@@ -41,9 +57,16 @@ class DocumentService:
         """Get paginated list of documents"""
         offset = (page - 1) * page_size
         
-        query = db.query(Document).order_by(desc(Document.uploaded_at))
-        total = query.count()
-        documents = query.offset(offset).limit(page_size).all()
+        total = db.query(func.count(Document.id)).scalar()
+        # Highlights are serialized with each DocumentResponse; load them in one extra query
+        documents = (
+            db.query(Document)
+            .options(selectinload(Document.highlights))
+            .order_by(desc(Document.uploaded_at))
+            .offset(offset)
+            .limit(page_size)
+            .all()
+        )
         
         return documents, total
 
@@ -58,7 +81,7 @@ class DocumentService:
         if not document:
             return None
         
-        update_data = updates.dict(exclude_unset=True)
+        update_data = updates.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(document, field, value)
         
@@ -73,20 +96,21 @@ class DocumentService:
         if not document:
             return False
         
-        # Delete physical file
+        # Delete physical file, and its cached text extraction while it can still be hashed
         try:
             file_path = Path(document.file_path)
             if file_path.exists():
+                self.pdf_service.evict_cached_extraction(str(file_path))
                 file_path.unlink()
-        except Exception as e:
-            print(f"Error deleting file: {e}")
+        except Exception:
+            logger.exception("Error deleting file for document %s", document_id)
         
         # Delete from S3 if exists
         if document.s3_key:
             try:
                 await self.storage_service.delete_file(document.s3_key)
-            except Exception as e:
-                print(f"Error deleting from S3: {e}")
+            except Exception:
+                logger.exception("Error deleting document %s from S3", document_id)
         
         # Delete database record (cascades to summaries and highlights)
         db.delete(document)
@@ -104,11 +128,22 @@ class DocumentService:
         """Search documents by name or content"""
         offset = (page - 1) * page_size
         
-        # Basic text search - in production, use full-text search or vector search
-        search_filter = or_(
-            Document.original_name.ilike(f"%{query}%"),
-            Document.text_content.ilike(f"%{query}%")
-        )
+        name_filter = Document.original_name.ilike(f"%{query}%")
+        if db.get_bind().dialect.name == "postgresql":
+            # Full-text search backed by the ix_documents_text_content_fts GIN index. The
+            # name and content matches are separate id sets: ORed with the unindexable
+            # ILIKE, the planner would compute to_tsvector for every document instead
+            content_filter = func.to_tsvector("english", Document.text_content).op("@@")(
+                func.plainto_tsquery("english", query)
+            )
+            matching_ids = union(
+                select(Document.id).where(name_filter),
+                select(Document.id).where(content_filter)
+            ).subquery()
+            search_filter = Document.id.in_(select(matching_ids.c.id))
+        else:
+            # Basic text search fallback for SQLite
+            search_filter = or_(name_filter, Document.text_content.ilike(f"%{query}%"))
         
         db_query = db.query(Document).filter(search_filter).order_by(desc(Document.uploaded_at))
         total = db_query.count()
@@ -122,7 +157,10 @@ class DocumentService:
         document_id: str, 
         query: str
     ) -> List[dict]:
-        """Search within a specific document"""
+        """Search within a specific document; results follow schemas.DocumentMatch on every backend"""
+        if db.get_bind().dialect.name == "postgresql":
+            return self._search_in_document_fts(db, document_id, query)
+        
         document = db.query(Document).filter(Document.id == document_id).first()
         if not document or not document.text_content:
             return []
@@ -130,35 +168,58 @@ class DocumentService:
         # Simple text search within document
         # In production, this would use vector embeddings for semantic search
         results = []
-        text = document.text_content.lower()
-        query_lower = query.lower()
-        
-        # Find all occurrences
-        start = 0
-        while True:
-            pos = text.find(query_lower, start)
-            if pos == -1:
-                break
+        text = document.text_content
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        
+        # Find occurrences (limit results); match offsets index the original text directly
+        for match in islice(pattern.finditer(text), 10):
+            pos = match.start()
             
             # Extract context around the match
             context_start = max(0, pos - 100)
-            context_end = min(len(text), pos + len(query) + 100)
-            context = document.text_content[context_start:context_end]
+            context_end = min(len(text), match.end() + 100)
+            context = text[context_start:context_end]
             
             results.append({
                 "position": pos,
                 "context": context,
                 "relevance_score": 1.0  # Simple scoring
             })
-            
-            start = pos + 1
-            
-            # Limit results
-            if len(results) >= 10:
-                break
         
         return results
 
+    def _search_in_document_fts(self, db: Session, document_id: str, query: str) -> List[dict]:
+        """Search within a document on PostgreSQL so the text never leaves the database"""
+        tsquery = func.plainto_tsquery("english", query)
+        headline = func.ts_headline(
+            "english",
+            Document.text_content,
+            tsquery,
+            # Empty selectors keep the fragments plain text, like the SQLite path's context
+            f'MaxWords=30, MinWords=15, MaxFragments=10, FragmentDelimiter="{FTS_FRAGMENT_DELIMITER}", '
+            f'StartSel="", StopSel=""'
+        )
+        # Normalization 32 maps the rank into 0-1 (rank / (rank + 1)), the same scale as the literal path
+        rank = func.ts_rank(func.to_tsvector("english", Document.text_content), tsquery, 32)
+        
+        row = db.query(headline, rank).filter(
+            Document.id == document_id,
+            func.to_tsvector("english", Document.text_content).op("@@")(tsquery)
+        ).first()
+        if not row:
+            return []
+        
+        fragments, relevance_score = row
+        return [
+            {
+                "position": None,  # Stemmed matches have no literal offset in the text
+                "context": fragment,
+                "relevance_score": float(relevance_score)
+            }
+            for fragment in fragments.split(FTS_FRAGMENT_DELIMITER)
+            if fragment
+        ]
+
     async def update_processing_status(
         self, 
         db: Session, 
@@ -193,6 +254,43 @@ class DocumentService:
         
         return await self.update_document(db, document_id, updates)
 
+    async def bulk_update(self, db: Session, document_id: str, fields: dict) -> bool:
+        """Apply several column changes in a single UPDATE without loading the row"""
+        if not fields:
+            return False
+        
+        result = db.execute(
+            update(Document).where(Document.id == document_id).values(**fields)
+        )
+        db.commit()
+        
+        return result.rowcount > 0
+
+    def _insert_embeddings(self, db: Session, rows: Iterable[dict]) -> int:
+        """Multi-row INSERT of vector embeddings, EMBEDDING_INSERT_BATCH rows per statement"""
+        rows = iter(rows)
+        inserted = 0
+        while batch := list(islice(rows, EMBEDDING_INSERT_BATCH)):
+            db.execute(insert(VectorEmbedding), batch)
+            inserted += len(batch)
+        return inserted
+
+    async def bulk_create_embeddings(self, db: Session, rows: Iterable[dict]) -> int:
+        """Insert vector embedding rows with Core executemany and commit once"""
+        inserted = self._insert_embeddings(db, rows)
+        if inserted:
+            db.commit()
+        
+        return inserted
+
+    async def replace_document_embeddings(self, db: Session, document_id: str, rows: Iterable[dict]) -> int:
+        """Swap a document's stored embeddings for new rows in a single transaction"""
+        db.execute(delete(VectorEmbedding).where(VectorEmbedding.document_id == document_id))
+        inserted = self._insert_embeddings(db, rows)
+        db.commit()
+        
+        return inserted
+
     async def get_documents_by_status(
         self, 
         db: Session, 
@@ -201,12 +299,54 @@ class DocumentService:
         """Get documents by status"""
         return db.query(Document).filter(Document.status == status).all()
 
+    async def delete_documents(self, db: Session, document_ids: List[str]) -> int:
+        """Delete many documents and their files, with the DB rows removed in one transaction"""
+        if not document_ids:
+            return 0
+        
+        rows = db.query(Document.id, Document.file_path, Document.s3_key).filter(
+            Document.id.in_(document_ids)
+        ).all()
+        if not rows:
+            return 0
+        
+        # Delete physical files, and their cached text extractions while they can still be hashed
+        for document_id, file_path, _ in rows:
+            try:
+                path = Path(file_path)
+                if path.exists():
+                    self.pdf_service.evict_cached_extraction(file_path)
+                    path.unlink()
+            except Exception:
+                logger.exception("Error deleting file for document %s", document_id)
+        
+        # Delete from S3 concurrently
+        s3_keys = [s3_key for _, _, s3_key in rows if s3_key]
+        if s3_keys:
+            await asyncio.gather(
+                *(self.storage_service.delete_file(s3_key) for s3_key in s3_keys),
+                return_exceptions=True
+            )
+        
+        # Set-based deletes skip the ORM cascade, so remove child rows explicitly
+        ids = [document_id for document_id, _, _ in rows]
+        for model in (Summary, Highlight, VectorEmbedding, ProcessingJob):
+            db.execute(delete(model).where(model.document_id.in_(ids)))
+        db.execute(delete(Document).where(Document.id.in_(ids)))
+        db.commit()
+        
+        return len(ids)
+
     async def get_processing_stats(self, db: Session) -> dict:
         """Get processing statistics"""
-        total = db.query(Document).count()
-        completed = db.query(Document).filter(Document.status == "completed").count()
-        processing = db.query(Document).filter(Document.status == "processing").count()
-        error = db.query(Document).filter(Document.status == "error").count()
+        # Single GROUP BY instead of one COUNT(*) per status
+        counts = dict(
+            db.query(Document.status, func.count(Document.id)).group_by(Document.status).all()
+        )
+        total = sum(counts.values())
+        completed = counts.get("completed", 0)
+        processing = counts.get("processing", 0)
+        error = counts.get("error", 0)
         
         return {
             "total": total,
@@ -215,3 +355,8 @@ class DocumentService:
             "error": error,
             "completion_rate": (completed / total * 100) if total > 0 else 0
         }
+
+@lru_cache(maxsize=1)
+def get_document_service() -> DocumentService:
+    """Return the process-wide DocumentService, shared by request handlers and background tasks"""
+    return DocumentService()
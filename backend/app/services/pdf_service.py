@@ -1,63 +1,309 @@
-import PyPDF2
+from pypdf import PdfReader
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import aiofiles
+import asyncio
+import hashlib
 import io
+import json
+import logging
+import msgpack
+import multiprocessing
+import numpy as np
+import os
 import re
+import redis
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Patterns used by clean_pdf_text, compiled once per process
+_WS_RE = re.compile(r'\s+')
+_PAGENUM_RE = re.compile(r'\n\s*\d+\s*\n')
+_MULTINL_RE = re.compile(r'\n\s*\n\s*\n')
+
+# Words as split by str.split(), used for chunk offsets
+_WORD_RE = re.compile(r'\S+')
+
+# Every code point that str.isspace() (and so the \s in _WORD_RE) treats as whitespace
+_WHITESPACE_CODEPOINTS = np.array(
+    [*range(0x09, 0x0e), *range(0x1c, 0x21), 0x85, 0xa0, 0x1680, *range(0x2000, 0x200b),
+     0x2028, 0x2029, 0x202f, 0x205f, 0x3000],
+    dtype=np.uint32
+)
+
+# Below this many pages the process-pool round trip costs more than it saves
+PARALLEL_EXTRACTION_MIN_PAGES = 16
+EXTRACTION_WORKERS = os.cpu_count() or 1
+
+# Chunk lists are cached by text content, so entries never go stale; expired after a day
+CHUNK_CACHE_TTL = 24 * 60 * 60
+
+# Metadata per live reader; entries go away with the reader
+_metadata_cache: "weakref.WeakKeyDictionary[PdfReader, Dict[str, str]]" = weakref.WeakKeyDictionary()
+
+# In-memory file contents per live reader, so one processing call reads the file once;
+# released with the reader instead of being held for the life of the process
+_reader_bytes: "weakref.WeakKeyDictionary[PdfReader, bytes]" = weakref.WeakKeyDictionary()
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+def clean_pdf_text(text: str) -> str:
+    """Clean and normalize extracted text"""
+    if not text:
+        return ""
+    
+    # Remove excessive whitespace
+    text = _WS_RE.sub(' ', text)
+    
+    # Remove page numbers and headers/footers (basic patterns)
+    text = _PAGENUM_RE.sub('\n', text)
+    
+    # Fix common OCR issues
+    text = text.replace('�', '')  # Remove replacement characters
+    
+    # Normalize line breaks
+    text = _MULTINL_RE.sub('\n\n', text)  # Multiple line breaks to double
+    
+    # Strip leading/trailing whitespace
+    text = text.strip()
+    
+    return text
+
+def _extract_pages(pdf_reader: PdfReader, start: int, stop: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """Extract and clean pages [start, stop) as (page_number, cleaned_text, error) tuples"""
+    results = []
+    for index in range(start, stop):
+        try:
+            page_text = pdf_reader.pages[index].extract_text()
+            results.append((index + 1, clean_pdf_text(page_text) if page_text.strip() else '', None))
+        except Exception as e:
+            results.append((index + 1, None, str(e)))
+    return results
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """Process-pool entry point: open the PDF in the worker and extract a page range"""
+    # Only the path is pickled; each worker reads the file itself
+    return _extract_pages(PdfReader(file_path), start, stop)
+
+def _get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool for page extraction, or None where child processes aren't allowed"""
+    global _extraction_pool
+    # Celery prefork workers are daemonic and cannot spawn children, so only
+    # in-process extraction (the API's background processing) uses the pool
+    if EXTRACTION_WORKERS < 2 or multiprocessing.current_process().daemon:
+        return None
+    if _extraction_pool is None:
+        # forkserver: forking the threaded server process could copy held locks into the children
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _extraction_pool
+
+def _word_offsets(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end character offsets of every _WORD_RE match, computed as array ops over the code points"""
+    # UTF-32 gives one fixed-width element per character, so array indices are str indices
+    codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    is_word = np.empty(len(codepoints) + 2, dtype=bool)
+    is_word[0] = is_word[-1] = False
+    is_word[1:-1] = ~np.isin(codepoints, _WHITESPACE_CODEPOINTS)
+    
+    edges = np.flatnonzero(is_word[1:] != is_word[:-1])
+    return edges[0::2], edges[1::2]
+
+@lru_cache(maxsize=1)
+def _get_redis() -> redis.Redis:
+    """Shared Redis connection pool for the chunk cache; short timeouts so an outage only costs a recompute"""
+    return redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+def _build_metadata(pdf_reader: PdfReader) -> Dict[str, str]:
+    """Document info dict, resolved from the reader once and reused afterwards"""
+    if pdf_reader in _metadata_cache:
+        return _metadata_cache[pdf_reader]
+    
+    metadata = {}
+    info = pdf_reader.metadata
+    if info:
+        metadata = {
+            'title': info.get('/Title', ''),
+            'author': info.get('/Author', ''),
+            'subject': info.get('/Subject', ''),
+            'creator': info.get('/Creator', ''),
+            'producer': info.get('/Producer', ''),
+            'creation_date': str(info.get('/CreationDate', '')),
+            'modification_date': str(info.get('/ModDate', ''))
+        }
+    
+    _metadata_cache[pdf_reader] = metadata
+    return metadata
+
+def _content_digest(pdf_bytes: bytes) -> str:
+    """Hash of the PDF bytes, used as the extraction cache key"""
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
+def text_digest(text: str) -> str:
+    """Hash of extracted text, identifying a document's content independently of its length"""
+    return _content_digest(text.encode('utf-8', 'surrogatepass'))
 
 class PDFService:
     def __init__(self):
-        pass
+        self.cache_dir = Path(settings.pdf_cache_dir)
+
+    def _open_reader(self, file_path: str, pdf_bytes: Optional[bytes] = None) -> PdfReader:
+        """Parse the file from memory, reading it unless its bytes are passed; the bytes stay available while the reader is alive"""
+        if pdf_bytes is None:
+            pdf_bytes = Path(file_path).read_bytes()
+        pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
+        _reader_bytes[pdf_reader] = pdf_bytes
+        return pdf_reader
+
+    def shutdown(self):
+        """Stop the page extraction workers, if any were started; call on process shutdown"""
+        global _extraction_pool
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown(cancel_futures=True)
+            _extraction_pool = None
+
+    @asynccontextmanager
+    async def reader(self, file_path: str) -> AsyncIterator[PdfReader]:
+        """Open and parse the file once for a pipeline run; pass the reader to each step"""
+        loop = asyncio.get_running_loop()
+        pdf_reader = await loop.run_in_executor(None, self._open_reader, file_path)
+        yield pdf_reader
+
+    def read_pdf_bytes(self, file_path: str, reader: Optional[PdfReader] = None) -> bytes:
+        """Raw PDF bytes, taken from the reader's in-memory copy when one is passed"""
+        if reader is not None and reader in _reader_bytes:
+            return _reader_bytes[reader]
+        return Path(file_path).read_bytes()
+
+    def _cache_path(self, pdf_bytes: bytes) -> Path:
+        """Location of the cached extraction for this PDF content"""
+        return self.cache_dir / f"{_content_digest(pdf_bytes)}.json"
+
+    async def _get_cached_extraction(self, file_path: str, pdf_bytes: bytes) -> Optional[Dict[str, any]]:
+        """Return a previous extract_text_from_pdf result for identical content, if any"""
+        try:
+            cache_path = self._cache_path(pdf_bytes)
+            if not cache_path.exists():
+                return None
+            
+            async with aiofiles.open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.loads(await f.read())
+            # mtime doubles as last use, so pruning drops the least recently used entries
+            cache_path.touch()
+            
+            # JSON object keys are strings; page numbers are ints everywhere else
+            cached['page_texts'] = {int(page): text for page, text in cached['page_texts'].items()}
+            return cached
+            
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.exception("Error reading extraction cache for %s", file_path)
+            return None
 
-    async def extract_text_from_pdf(self, file_path: str) -> Dict[str, any]:
+    async def _store_cached_extraction(
+        self, 
+        file_path: str, 
+        result: Dict[str, any], 
+        pdf_bytes: bytes
+    ):
+        """Persist a successful extraction keyed by content hash, then prune the cache"""
+        try:
+            cache_path = self._cache_path(pdf_bytes)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Write then rename so concurrent readers never see a partial file
+            tmp_path = cache_path.with_suffix('.tmp')
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(result))
+            tmp_path.replace(cache_path)
+            
+            await asyncio.get_running_loop().run_in_executor(None, self._prune_cache)
+            
+        except Exception as e:
+            logger.exception("Error writing extraction cache for %s", file_path)
+
+    def _prune_cache(self):
+        """Drop entries unused for pdf_cache_max_age, then the least recently used until under pdf_cache_max_bytes"""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > settings.pdf_cache_max_age:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= settings.pdf_cache_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+    def evict_cached_extraction(self, file_path: str):
+        """Remove the cached extraction for a file; call before the file itself is deleted"""
+        try:
+            self._cache_path(self.read_pdf_bytes(file_path)).unlink(missing_ok=True)
+        except FileNotFoundError:
+            # File already gone; the entry ages out through _prune_cache
+            pass
+        except Exception:
+            logger.exception("Error evicting extraction cache for %s", file_path)
+
+    async def extract_text_from_pdf(self, file_path: str, reader: Optional[PdfReader] = None) -> Dict[str, any]:
         """Extract text content from PDF file"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Get basic info
-                num_pages = len(pdf_reader.pages)
-                text_content = []
-                page_texts = {}
-                
-                # Extract text from each page
-                for page_num, page in enumerate(pdf_reader.pages, 1):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            # Clean up the text
-                            cleaned_text = self._clean_text(page_text)
-                            text_content.append(cleaned_text)
-                            page_texts[page_num] = cleaned_text
-                    except Exception as e:
-                        print(f"Error extracting text from page {page_num}: {e}")
-                        page_texts[page_num] = ""
-                
-                # Combine all text
-                full_text = "\n\n".join(text_content)
-                
-                # Get metadata
-                metadata = {}
-                if pdf_reader.metadata:
-                    metadata = {
-                        'title': pdf_reader.metadata.get('/Title', ''),
-                        'author': pdf_reader.metadata.get('/Author', ''),
-                        'subject': pdf_reader.metadata.get('/Subject', ''),
-                        'creator': pdf_reader.metadata.get('/Creator', ''),
-                        'producer': pdf_reader.metadata.get('/Producer', ''),
-                        'creation_date': str(pdf_reader.metadata.get('/CreationDate', '')),
-                        'modification_date': str(pdf_reader.metadata.get('/ModDate', ''))
-                    }
-                
-                return {
-                    'success': True,
-                    'text': full_text,
-                    'page_count': num_pages,
-                    'page_texts': page_texts,
-                    'metadata': metadata,
-                    'word_count': len(full_text.split()) if full_text else 0,
-                    'character_count': len(full_text) if full_text else 0
-                }
-                
+            # Read once: the same buffer keys the cache and is parsed on a miss
+            pdf_bytes = self.read_pdf_bytes(file_path, reader)
+            cached = await self._get_cached_extraction(file_path, pdf_bytes)
+            if cached:
+                return cached
+            
+            pdf_reader = reader or self._open_reader(file_path, pdf_bytes)
+            
+            # Get basic info
+            num_pages = len(pdf_reader.pages)
+            text_content = []
+            page_texts = {}
+            
+            # Extract text from each page
+            for page_num, cleaned_text, error in await self._extract_all_pages(file_path, pdf_reader, num_pages):
+                if error is not None:
+                    logger.warning("Error extracting text from page %d of %s: %s", page_num, file_path, error)
+                    page_texts[page_num] = ""
+                elif cleaned_text:
+                    text_content.append(cleaned_text)
+                    page_texts[page_num] = cleaned_text
+            
+            # Combine all text
+            full_text = "\n\n".join(text_content)
+            
+            # Get metadata
+            metadata = _build_metadata(pdf_reader)
+            
+            result = {
+                'success': True,
+                'text': full_text,
+                'page_count': num_pages,
+                'page_texts': page_texts,
+                'metadata': metadata,
+                'word_count': len(full_text.split()) if full_text else 0,
+                'character_count': len(full_text) if full_text else 0
+            }
+            
         except Exception as e:
             return {
                 'success': False,
@@ -67,161 +313,194 @@ class PDFService:
                 'page_texts': {},
                 'metadata': {}
             }
+        
+        await self._store_cached_extraction(file_path, result, pdf_bytes)
+        return result
+
+    async def _extract_all_pages(
+        self, 
+        file_path: str, 
+        pdf_reader: PdfReader, 
+        num_pages: int
+    ) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        """Extract every page, spreading page ranges over worker processes for large PDFs"""
+        pool = _get_extraction_pool() if num_pages >= PARALLEL_EXTRACTION_MIN_PAGES else None
+        if pool is None:
+            return _extract_pages(pdf_reader, 0, num_pages)
+        
+        # One contiguous range per worker so each process parses the PDF only once
+        step = -(-num_pages // EXTRACTION_WORKERS)
+        loop = asyncio.get_running_loop()
+        ranges = await asyncio.gather(*[
+            loop.run_in_executor(pool, _extract_page_range, str(file_path), start, min(start + step, num_pages))
+            for start in range(0, num_pages, step)
+        ])
+        return [page for page_range in ranges for page in page_range]
 
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
-        if not text:
-            return ""
-        
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove page numbers and headers/footers (basic patterns)
-        text = re.sub(r'\n\s*\d+\s*\n', '\n', text)
-        
-        # Fix common OCR issues
-        text = text.replace('�', '')  # Remove replacement characters
-        
-        # Normalize line breaks
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)  # Multiple line breaks to double
-        
-        # Strip leading/trailing whitespace
-        text = text.strip()
-        
-        return text
+        return clean_pdf_text(text)
 
-    async def get_pdf_info(self, file_path: str) -> Dict[str, any]:
+    async def get_pdf_info(self, file_path: str, reader: Optional[PdfReader] = None) -> Dict[str, any]:
         """Get basic PDF information without full text extraction"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                num_pages = len(pdf_reader.pages)
-                
-                # Get metadata
-                metadata = {}
-                if pdf_reader.metadata:
-                    metadata = {
-                        'title': pdf_reader.metadata.get('/Title', ''),
-                        'author': pdf_reader.metadata.get('/Author', ''),
-                        'subject': pdf_reader.metadata.get('/Subject', ''),
-                        'creator': pdf_reader.metadata.get('/Creator', ''),
-                        'producer': pdf_reader.metadata.get('/Producer', ''),
-                        'creation_date': str(pdf_reader.metadata.get('/CreationDate', '')),
-                        'modification_date': str(pdf_reader.metadata.get('/ModDate', ''))
-                    }
-                
-                # Check if PDF is encrypted
-                is_encrypted = pdf_reader.is_encrypted
-                
-                return {
-                    'success': True,
-                    'page_count': num_pages,
-                    'metadata': metadata,
-                    'is_encrypted': is_encrypted,
-                    'file_size': Path(file_path).stat().st_size
-                }
-                
+            pdf_reader = reader or self._open_reader(file_path)
+            
+            num_pages = len(pdf_reader.pages)
+            
+            # Get metadata
+            metadata = _build_metadata(pdf_reader)
+            
+            # Check if PDF is encrypted
+            is_encrypted = pdf_reader.is_encrypted
+            
+            return {
+                'success': True,
+                'page_count': num_pages,
+                'metadata': metadata,
+                'is_encrypted': is_encrypted,
+                'file_size': Path(file_path).stat().st_size
+            }
+            
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Failed to get PDF info: {str(e)}"
             }
 
-    async def extract_text_from_page(self, file_path: str, page_number: int) -> Dict[str, any]:
+    async def extract_text_from_page(
+        self, 
+        file_path: str, 
+        page_number: int, 
+        reader: Optional[PdfReader] = None
+    ) -> Dict[str, any]:
         """Extract text from a specific page"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                if page_number < 1 or page_number > len(pdf_reader.pages):
-                    return {
-                        'success': False,
-                        'error': f"Page {page_number} does not exist. PDF has {len(pdf_reader.pages)} pages."
-                    }
-                
-                page = pdf_reader.pages[page_number - 1]  # Convert to 0-based index
-                page_text = page.extract_text()
-                cleaned_text = self._clean_text(page_text)
-                
+            # A cached full extraction already holds every page's cleaned text
+            pdf_bytes = self.read_pdf_bytes(file_path, reader)
+            cached = await self._get_cached_extraction(file_path, pdf_bytes)
+            if cached and 1 <= page_number <= cached['page_count']:
+                cleaned_text = cached['page_texts'].get(page_number, '')
                 return {
                     'success': True,
                     'text': cleaned_text,
                     'page_number': page_number,
                     'word_count': len(cleaned_text.split()) if cleaned_text else 0
                 }
-                
+            
+            pdf_reader = reader or self._open_reader(file_path, pdf_bytes)
+            
+            if page_number < 1 or page_number > len(pdf_reader.pages):
+                return {
+                    'success': False,
+                    'error': f"Page {page_number} does not exist. PDF has {len(pdf_reader.pages)} pages."
+                }
+            
+            page = pdf_reader.pages[page_number - 1]  # Convert to 0-based index
+            page_text = page.extract_text()
+            cleaned_text = self._clean_text(page_text)
+            
+            return {
+                'success': True,
+                'text': cleaned_text,
+                'page_number': page_number,
+                'word_count': len(cleaned_text.split()) if cleaned_text else 0
+            }
+            
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Failed to extract text from page {page_number}: {str(e)}"
             }
 
-    async def search_text_in_pdf(self, file_path: str, query: str) -> List[Dict[str, any]]:
+    async def search_text_in_pdf(
+        self, 
+        file_path: str, 
+        query: str, 
+        reader: Optional[PdfReader] = None
+    ) -> List[Dict[str, any]]:
         """Search for text within PDF and return matches with page numbers"""
         try:
             results = []
             
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num, page in enumerate(pdf_reader.pages, 1):
-                    try:
-                        page_text = page.extract_text()
-                        cleaned_text = self._clean_text(page_text)
+            pdf_bytes = self.read_pdf_bytes(file_path, reader)
+            cached = await self._get_cached_extraction(file_path, pdf_bytes)
+            if cached:
+                pages = sorted(cached['page_texts'].items())
+            else:
+                pages = self._iter_clean_pages(reader or self._open_reader(file_path, pdf_bytes))
+            
+            # Case-insensitive literal match, compiled once for all pages
+            pattern = re.compile(re.escape(query), re.IGNORECASE)
+            
+            for page_num, cleaned_text in pages:
+                try:
+                    # Find all occurrences in the page
+                    for match in pattern.finditer(cleaned_text):
+                        pos = match.start()
+                        
+                        # Extract context around the match
+                        context_start = max(0, pos - 100)
+                        context_end = min(len(cleaned_text), match.end() + 100)
+                        context = cleaned_text[context_start:context_end]
+                        
+                        results.append({
+                            'page_number': page_num,
+                            'position': pos,
+                            'context': context,
+                            'match': match.group()
+                        })
                         
-                        # Case-insensitive search
-                        if query.lower() in cleaned_text.lower():
-                            # Find all occurrences in the page
-                            text_lower = cleaned_text.lower()
-                            query_lower = query.lower()
-                            
-                            start = 0
-                            while True:
-                                pos = text_lower.find(query_lower, start)
-                                if pos == -1:
-                                    break
-                                
-                                # Extract context around the match
-                                context_start = max(0, pos - 100)
-                                context_end = min(len(cleaned_text), pos + len(query) + 100)
-                                context = cleaned_text[context_start:context_end]
-                                
-                                results.append({
-                                    'page_number': page_num,
-                                    'position': pos,
-                                    'context': context,
-                                    'match': cleaned_text[pos:pos + len(query)]
-                                })
-                                
-                                start = pos + 1
-                                
-                    except Exception as e:
-                        print(f"Error searching page {page_num}: {e}")
-                        continue
+                except Exception:
+                    logger.exception("Error searching page %d of %s", page_num, file_path)
+                    continue
             
             return results
             
-        except Exception as e:
-            print(f"Error searching PDF: {e}")
+        except Exception:
+            logger.exception("Error searching PDF %s", file_path)
             return []
 
-    async def validate_pdf(self, file_path: str) -> Dict[str, any]:
-        """Validate PDF file integrity and readability"""
+    def _iter_clean_pages(self, pdf_reader: PdfReader) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, cleaned_text) for each readable page"""
+        for page_num, page in enumerate(pdf_reader.pages, 1):
+            try:
+                yield page_num, self._clean_text(page.extract_text())
+            except Exception:
+                logger.exception("Error searching page %d", page_num)
+
+    async def validate_pdf(
+        self, 
+        file_path: str, 
+        reader: Optional[PdfReader] = None, 
+        strict: bool = False
+    ) -> Dict[str, any]:
+        """Validate PDF file integrity; strict also parses the first page's content stream"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Basic validation
-                num_pages = len(pdf_reader.pages)
-                
-                if num_pages == 0:
+            # Reject non-PDFs from the magic bytes before parsing anything
+            if reader is None:
+                with open(file_path, 'rb') as f:
+                    header = f.read(8)
+                if not header.startswith(b'%PDF-'):
                     return {
                         'valid': False,
-                        'error': 'PDF has no pages'
+                        'error': 'Missing %PDF- header'
                     }
-                
-                # Check if we can read at least the first page
+            
+            pdf_reader = reader or self._open_reader(file_path)
+            
+            # Basic validation: page tree and document catalog resolve
+            num_pages = len(pdf_reader.pages)
+            pdf_reader.trailer['/Root']
+            
+            if num_pages == 0:
+                return {
+                    'valid': False,
+                    'error': 'PDF has no pages'
+                }
+            
+            # Check if we can read at least the first page
+            if strict:
                 try:
                     first_page = pdf_reader.pages[0]
                     first_page.extract_text()
@@ -230,58 +509,105 @@ class PDFService:
                         'valid': False,
                         'error': f'Cannot read PDF content: {str(e)}'
                     }
-                
-                # Check if encrypted and needs password
-                is_encrypted = pdf_reader.is_encrypted
-                
-                return {
-                    'valid': True,
-                    'page_count': num_pages,
-                    'is_encrypted': is_encrypted,
-                    'readable': True
-                }
-                
+            
+            # Check if encrypted and needs password
+            is_encrypted = pdf_reader.is_encrypted
+            
+            return {
+                'valid': True,
+                'page_count': num_pages,
+                'is_encrypted': is_encrypted,
+                'readable': True
+            }
+            
         except Exception as e:
             return {
                 'valid': False,
                 'error': f'Invalid PDF file: {str(e)}'
             }
 
+    async def get_or_cache_chunks(
+        self, 
+        document_id: str, 
+        text: str, 
+        chunk_size: int = 1000, 
+        overlap: int = 100
+    ) -> List[Dict[str, any]]:
+        """get_text_chunks, memoized in Redis as msgpack per (text content, chunk_size, overlap)"""
+        # Keyed on the text itself, so a re-extraction with different content never hits a stale entry
+        key = f"chunks:{text_digest(text)}:{chunk_size}:{overlap}"
+        # The Redis client is synchronous; run its calls off the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            cached = await loop.run_in_executor(None, _get_redis().get, key)
+            if cached is not None:
+                return msgpack.unpackb(cached)
+        except redis.RedisError as e:
+            logger.warning("Chunk cache read failed for %s: %s", document_id, e)
+        
+        chunks = self.get_text_chunks(text, chunk_size, overlap)
+        
+        try:
+            await loop.run_in_executor(None, _get_redis().setex, key, CHUNK_CACHE_TTL, msgpack.packb(chunks))
+        except redis.RedisError as e:
+            logger.warning("Chunk cache write failed for %s: %s", document_id, e)
+        
+        return chunks
+
     def get_text_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 100) -> List[Dict[str, any]]:
         """Split text into chunks for processing"""
         if not text:
             return []
         
+        # Whitespace count bounds the word count without allocating per-word objects
+        approx_words = sum(text.count(ch) for ch in ' \n\t\r') + 1
+        if approx_words <= chunk_size:
+            num_words = sum(1 for _ in _WORD_RE.finditer(text))
+            if num_words <= chunk_size:
+                return [{
+                    'text': text,
+                    'chunk_index': 0,
+                    'word_count': num_words,
+                    'start_word': 0,
+                    'end_word': num_words
+                }]
+        
         chunks = []
-        words = text.split()
+        # Character offsets of each word, so chunks are slices of the original text rather than re-joined words
+        word_starts, word_ends = _word_offsets(text)
+        num_words = len(word_starts)
         
-        if len(words) <= chunk_size:
+        if num_words <= chunk_size:
             return [{
                 'text': text,
                 'chunk_index': 0,
-                'word_count': len(words),
+                'word_count': num_words,
                 'start_word': 0,
-                'end_word': len(words)
+                'end_word': num_words
             }]
         
         start = 0
         chunk_index = 0
         
-        while start < len(words):
-            end = min(start + chunk_size, len(words))
-            chunk_words = words[start:end]
-            chunk_text = ' '.join(chunk_words)
+        while start < num_words:
+            end = min(start + chunk_size, num_words)
+            chunk_text = text[int(word_starts[start]):int(word_ends[end - 1])]
             
             chunks.append({
                 'text': chunk_text,
                 'chunk_index': chunk_index,
-                'word_count': len(chunk_words),
+                'word_count': end - start,
                 'start_word': start,
                 'end_word': end
             })
             
             # Move start position with overlap
-            start = end - overlap if end < len(words) else end
+            start = end - overlap if end < num_words else end
             chunk_index += 1
         
         return chunks
+
+@lru_cache(maxsize=1)
+def get_pdf_service() -> PDFService:
+    """Return the process-wide PDFService, shared by request handlers and background tasks"""
+    return PDFService()
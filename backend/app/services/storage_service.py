@@ -1,160 +1,178 @@
-import boto3
+import aioboto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
-from typing import Optional, BinaryIO
+from contextlib import AsyncExitStack
+from functools import lru_cache
+from typing import Optional
 from pathlib import Path
-import aiofiles
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import io
+import logging
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Large PDFs are sent as concurrent 8MB multipart chunks
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    use_threads=True
+)
+
+@lru_cache(maxsize=1)
+def get_s3_session() -> Optional[aioboto3.Session]:
+    """Process-wide S3 session shared by every StorageService; None without credentials"""
+    if not (settings.aws_access_key_id and settings.aws_secret_access_key):
+        return None
+    
+    return aioboto3.Session(
+        aws_access_key_id=settings.aws_access_key_id,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        region_name=settings.aws_region
+    )
+
 class StorageService:
     def __init__(self):
-        self.s3_client = None
+        self.session = get_s3_session()
         self.bucket_name = settings.s3_bucket_name
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._s3_client = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client_lock: Optional[asyncio.Lock] = None
+
+    async def _client(self):
+        """Native async S3 client, opened once per event loop so its connection pool and TLS sessions are reused"""
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            # A client bound to another (closed) loop can't be used or closed from here; drop it
+            self._client_loop = loop
+            self._client_lock = asyncio.Lock()
+            self._exit_stack = self._s3_client = None
         
-        # Initialize S3 client if credentials are available
-        if settings.aws_access_key_id and settings.aws_secret_access_key:
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.aws_access_key_id,
-                aws_secret_access_key=settings.aws_secret_access_key,
-                region_name=settings.aws_region
-            )
+        # Concurrent first calls (e.g. gathered deletes) share one client
+        async with self._client_lock:
+            if self._s3_client is None:
+                exit_stack = AsyncExitStack()
+                self._s3_client = await exit_stack.enter_async_context(self.session.client('s3'))
+                self._exit_stack = exit_stack
+        return self._s3_client
+
+    async def close(self):
+        """Close the shared S3 client on shutdown"""
+        if self._exit_stack is not None:
+            exit_stack, self._exit_stack, self._s3_client = self._exit_stack, None, None
+            await exit_stack.aclose()
 
     async def upload_file(self, file_path: str, s3_key: str) -> bool:
         """Upload file to S3 storage"""
-        if not self.s3_client:
+        if not self.session:
             return False
         
         try:
-            # Run S3 upload in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self.executor,
-                self._upload_file_sync,
+            s3_client = await self._client()
+            await s3_client.upload_file(
                 file_path,
-                s3_key
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={'ContentType': 'application/pdf'},
+                Config=S3_TRANSFER_CONFIG
             )
             return True
-            
-        except Exception as e:
-            print(f"S3 upload error: {e}")
+        
+        except Exception:
+            logger.exception("S3 upload failed for key=%s", s3_key)
             return False
 
-    def _upload_file_sync(self, file_path: str, s3_key: str):
-        """Synchronous S3 upload"""
-        self.s3_client.upload_file(
-            file_path,
-            self.bucket_name,
-            s3_key,
-            ExtraArgs={'ContentType': 'application/pdf'}
-        )
+    async def upload_bytes(self, data: bytes, s3_key: str) -> bool:
+        """Upload an in-memory PDF to S3 without re-reading it from disk"""
+        if not self.session:
+            return False
+        
+        try:
+            s3_client = await self._client()
+            await s3_client.upload_fileobj(
+                io.BytesIO(data),
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={'ContentType': 'application/pdf'},
+                Config=S3_TRANSFER_CONFIG
+            )
+            return True
+        
+        except Exception:
+            logger.exception("S3 upload failed for key=%s", s3_key)
+            return False
 
     async def download_file(self, s3_key: str, local_path: str) -> bool:
         """Download file from S3 storage"""
-        if not self.s3_client:
+        if not self.session:
             return False
         
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self.executor,
-                self._download_file_sync,
+            s3_client = await self._client()
+            await s3_client.download_file(
+                self.bucket_name,
                 s3_key,
-                local_path
+                local_path,
+                Config=S3_TRANSFER_CONFIG
             )
             return True
-            
-        except Exception as e:
-            print(f"S3 download error: {e}")
+        
+        except Exception:
+            logger.exception("S3 download failed for key=%s", s3_key)
             return False
 
-    def _download_file_sync(self, s3_key: str, local_path: str):
-        """Synchronous S3 download"""
-        self.s3_client.download_file(
-            self.bucket_name,
-            s3_key,
-            local_path
-        )
-
     async def delete_file(self, s3_key: str) -> bool:
         """Delete file from S3 storage"""
-        if not self.s3_client:
+        if not self.session:
             return False
         
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self.executor,
-                self._delete_file_sync,
-                s3_key
+            s3_client = await self._client()
+            await s3_client.delete_object(
+                Bucket=self.bucket_name,
+                Key=s3_key
             )
             return True
-            
-        except Exception as e:
-            print(f"S3 delete error: {e}")
+        
+        except Exception:
+            logger.exception("S3 delete failed for key=%s", s3_key)
             return False
 
-    def _delete_file_sync(self, s3_key: str):
-        """Synchronous S3 delete"""
-        self.s3_client.delete_object(
-            Bucket=self.bucket_name,
-            Key=s3_key
-        )
-
     async def file_exists(self, s3_key: str) -> bool:
         """Check if file exists in S3"""
-        if not self.s3_client:
+        if not self.session:
             return False
         
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self.executor,
-                self._file_exists_sync,
-                s3_key
+            s3_client = await self._client()
+            await s3_client.head_object(
+                Bucket=self.bucket_name,
+                Key=s3_key
             )
             return True
-            
+        
         except ClientError:
             return False
 
-    def _file_exists_sync(self, s3_key: str):
-        """Synchronous S3 file existence check"""
-        self.s3_client.head_object(
-            Bucket=self.bucket_name,
-            Key=s3_key
-        )
-
     async def get_file_url(self, s3_key: str, expires_in: int = 3600) -> Optional[str]:
         """Generate presigned URL for file access"""
-        if not self.s3_client:
+        if not self.session:
             return None
         
         try:
-            loop = asyncio.get_event_loop()
-            url = await loop.run_in_executor(
-                self.executor,
-                self._generate_presigned_url_sync,
-                s3_key,
-                expires_in
+            s3_client = await self._client()
+            return await s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': s3_key},
+                ExpiresIn=expires_in
             )
-            return url
-            
-        except Exception as e:
-            print(f"Presigned URL error: {e}")
+        
+        except Exception:
+            logger.exception("Presigned URL generation failed for key=%s", s3_key)
             return None
 
-    def _generate_presigned_url_sync(self, s3_key: str, expires_in: int) -> str:
-        """Synchronous presigned URL generation"""
-        return self.s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': self.bucket_name, 'Key': s3_key},
-            ExpiresIn=expires_in
-        )
-
     def get_s3_key(self, document_id: str, filename: str) -> str:
         """Generate S3 key for document"""
         return f"documents/{document_id}/{filename}"
@@ -166,6 +184,11 @@ class StorageService:
             if path.exists():
                 path.unlink()
             return True
-        except Exception as e:
-            print(f"Local file cleanup error: {e}")
+        except Exception:
+            logger.exception("Local file cleanup failed for %s", file_path)
             return False
+
+@lru_cache(maxsize=1)
+def get_storage_service() -> StorageService:
+    """Return the process-wide StorageService, whose S3 client is shared by every caller"""
+    return StorageService()
@@ -1,32 +1,66 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from functools import lru_cache
+from typing import Optional, List, AsyncIterator
 from datetime import datetime
 import time
 
 from app.models import Summary, Document
 from app.schemas import SummaryCreate
-from app.services.ai_service import AIService
+from app.services.ai_service import get_ai_service
 
 class SummaryService:
     def __init__(self):
-        self.ai_service = AIService()
+        self.ai_service = get_ai_service()
+
+    def _insert_ignoring_existing(self, db: Session):
+        """INSERT that skips documents which already have a summary, where the dialect supports it"""
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.get_bind().dialect.name)
+        if dialect is None:
+            return None
+        
+        return dialect.insert(Summary).on_conflict_do_nothing(index_elements=[Summary.document_id])
 
     async def create_summary(self, db: Session, summary_data: SummaryCreate) -> Summary:
-        """Create a new summary record"""
-        summary = Summary(
-            document_id=summary_data.document_id,
-            content=summary_data.content,
-            key_points=summary_data.key_points,
-            processing_time=summary_data.processing_time,
-            model_used=summary_data.model_used
-        )
-        
-        db.add(summary)
+        """Create the summary for a document, or return the one that already exists"""
+        stmt = self._insert_ignoring_existing(db)
+        if stmt is None:
+            summary = Summary(**summary_data.model_dump())
+            db.add(summary)
+            db.commit()
+            db.refresh(summary)
+            return summary
+        
+        # Single INSERT ... ON CONFLICT DO NOTHING RETURNING; concurrent generators can't duplicate
+        summary = db.scalars(stmt.values(**summary_data.model_dump()).returning(Summary)).first()
         db.commit()
-        db.refresh(summary)
+        
+        # Lost the race: another worker inserted first, return its row
+        if summary is None:
+            summary = await self.get_summary_by_document_id(db, summary_data.document_id)
         
         return summary
 
+    async def create_summaries_bulk(self, db: Session, items: List[SummaryCreate]) -> int:
+        """Insert many summaries in one executemany and commit once; returns how many rows were written"""
+        if not items:
+            return 0
+        
+        rows = [item.model_dump() for item in items]
+        stmt = self._insert_ignoring_existing(db)
+        if stmt is None:
+            # Without ON CONFLICT a duplicate raises, so every row was written
+            db.execute(insert(Summary), rows)
+            db.commit()
+            return len(rows)
+        
+        # Documents that already have a summary are skipped; RETURNING reports only the rows written
+        inserted = db.scalars(stmt.returning(Summary.id), rows).all()
+        db.commit()
+        
+        return len(inserted)
+
     async def get_summary_by_document_id(self, db: Session, document_id: str) -> Optional[Summary]:
         """Get summary by document ID"""
         return db.query(Summary).filter(Summary.document_id == document_id).first()
@@ -37,19 +71,20 @@ class SummaryService:
 
     async def generate_summary(self, db: Session, document_id: str) -> Summary:
         """Generate AI summary for document"""
-        # Get document
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if not document:
+        # Get document and any existing summary in one round trip
+        row = db.query(Document, Summary).outerjoin(
+            Summary, Summary.document_id == Document.id
+        ).filter(Document.id == document_id).first()
+        if not row:
             raise ValueError("Document not found")
         
-        if not document.text_content:
-            raise ValueError("Document has no text content")
-        
-        # Check if summary already exists
-        existing_summary = await self.get_summary_by_document_id(db, document_id)
+        document, existing_summary = row
         if existing_summary:
             return existing_summary
         
+        if not document.text_content:
+            raise ValueError("Document has no text content")
+        
         # Generate summary using AI service
         start_time = time.time()
         
@@ -110,6 +145,22 @@ class SummaryService:
         
         return True
 
+    async def iter_summaries_by_date_range(
+        self, 
+        db: Session, 
+        start_date: datetime, 
+        end_date: datetime, 
+        batch_size: int = 1000
+    ) -> AsyncIterator[Summary]:
+        """Stream summaries created within date range in fixed-size batches"""
+        query = db.query(Summary).filter(
+            Summary.created_at >= start_date,
+            Summary.created_at <= end_date
+        ).yield_per(batch_size)
+        
+        for summary in query:
+            yield summary
+
     async def get_summaries_by_date_range(
         self, 
         db: Session, 
@@ -117,14 +168,17 @@ class SummaryService:
         end_date: datetime
     ) -> List[Summary]:
         """Get summaries created within date range"""
-        return db.query(Summary).filter(
-            Summary.created_at >= start_date,
-            Summary.created_at <= end_date
-        ).all()
+        return [summary async for summary in self.iter_summaries_by_date_range(db, start_date, end_date)]
 
     async def get_summary_stats(self, db: Session) -> dict:
         """Get summary statistics"""
-        total_summaries = db.query(Summary).count()
+        # One aggregate query; COUNT/AVG/SUM over processing_time skip NULLs
+        total_summaries, avg_processing_time, total_processing_time, summaries_with_timing = db.query(
+            func.count(Summary.id),
+            func.avg(Summary.processing_time),
+            func.sum(Summary.processing_time),
+            func.count(Summary.processing_time)
+        ).one()
         
         if total_summaries == 0:
             return {
@@ -133,16 +187,14 @@ class SummaryService:
                 "total_processing_time": 0
             }
         
-        # Calculate average processing time
-        summaries = db.query(Summary).filter(Summary.processing_time.isnot(None)).all()
-        processing_times = [s.processing_time for s in summaries if s.processing_time]
-        
-        avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
-        total_processing_time = sum(processing_times) if processing_times else 0
-        
         return {
             "total_summaries": total_summaries,
-            "average_processing_time": round(avg_processing_time, 2),
-            "total_processing_time": round(total_processing_time, 2),
-            "summaries_with_timing": len(processing_times)
+            "average_processing_time": round(avg_processing_time or 0, 2),
+            "total_processing_time": round(total_processing_time or 0, 2),
+            "summaries_with_timing": summaries_with_timing
         }
+
+@lru_cache(maxsize=1)
+def get_summary_service() -> SummaryService:
+    """Return the process-wide SummaryService, shared by request handlers and background tasks"""
+    return SummaryService()
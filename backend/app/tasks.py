@@ -1,31 +1,196 @@
-from celery import current_task
+from celery import current_task, group
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import Dict, List
+from sqlalchemy import and_, bindparam, select
+from typing import Awaitable, Dict, Iterator, List, Optional, TypeVar
 import traceback
 import logging
 import asyncio
+import numpy as np
 
 from app.celery_app import celery_app
-from app.database import SessionLocal
+from app.config import settings
+from app.database import TaskSession
+from app.embedding_codec import quantize_embeddings
 from app.models import Document
-from app.services.document_service import DocumentService
-from app.services.pdf_service import PDFService
-from app.services.ai_service import AIService
-from app.services.summary_service import SummaryService
-from app.services.storage_service import StorageService
+from app.services.document_service import get_document_service
+from app.services.pdf_service import get_pdf_service, text_digest
+from app.services.ai_service import get_ai_service
+from app.services.summary_service import get_summary_service
+from app.services.storage_service import get_storage_service
 from app.schemas import SummaryCreate
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize services
-document_service = DocumentService()
-pdf_service = PDFService()
-ai_service = AIService()
-summary_service = SummaryService()
-storage_service = StorageService()
+document_service = get_document_service()
+pdf_service = get_pdf_service()
+ai_service = get_ai_service()
+summary_service = get_summary_service()
+storage_service = get_storage_service()
+
+T = TypeVar("T")
+
+# Words per chunk for embeddings generated during document processing
+EMBED_CHUNK_SIZE = 1000
+
+# Failed documents deleted per cleanup subtask (one DB transaction each)
+CLEANUP_BATCH_SIZE = 100
+
+# Built once with a bound cutoff so every run hits SQLAlchemy's compiled-statement cache
+FAILED_DOCUMENTS_STMT = select(Document.id).where(
+    and_(
+        Document.status == "error",
+        Document.updated_at < bindparam("cutoff")
+    )
+)
+
+# One event loop per worker process, reused by every task it runs. Pooled
+# async clients (Groq/httpx) are bound to the loop that first used them.
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a task's coroutine to completion on this process's event loop"""
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+    return _event_loop.run_until_complete(coro)
+
+def _is_out_of_memory(error: Exception) -> bool:
+    """True for host MemoryError and torch/CUDA 'out of memory' failures"""
+    return isinstance(error, MemoryError) or "out of memory" in str(error).lower()
+
+def _estimate_tokens(text: str, max_tokens: int) -> int:
+    """Rough subword count (~4 characters per token) used for batch packing"""
+    # The encoder truncates every input to max_tokens, so longer texts cost no more
+    return min(len(text) // 4 + 1, max_tokens)
+
+async def _embed_in_batches(texts: List[str]) -> np.ndarray:
+    """Embed texts in length-sorted mini-batches packed to a token budget, halving the batch on OOM"""
+    # Similar-length texts share a batch so little compute goes to padding;
+    # results are scattered back into input order
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    max_batch = max(1, settings.embed_batch_size)
+    max_tokens = ai_service.embedding_model.max_seq_length
+    result = None
+    start = 0
+    
+    while start < len(order):
+        # Grow the batch while its padded size (count x longest) fits the budget
+        end = start + 1
+        while (
+            end < len(order)
+            and end - start < max_batch
+            and (end - start + 1) * _estimate_tokens(texts[order[end]], max_tokens) <= settings.embed_token_budget
+        ):
+            end += 1
+        
+        batch_indices = order[start:end]
+        try:
+            batch_embeddings = await ai_service.generate_embeddings(
+                [texts[i] for i in batch_indices], 
+                batch_size=len(batch_indices)
+            )
+        except Exception as e:
+            if len(batch_indices) == 1 or not _is_out_of_memory(e):
+                raise
+            max_batch = len(batch_indices) // 2
+            logger.warning(f"Embedding batch ran out of memory, retrying with batch size {max_batch}")
+            continue
+        
+        if result is None:
+            result = np.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+        result[batch_indices] = batch_embeddings
+        start = end
+    
+    return result if result is not None else np.empty((0, 0), dtype=np.float32)
+
+def _embedding_metadata(text: str, chunk_size: int, chunk_count: int) -> Dict:
+    """Record of what the stored embeddings were generated from"""
+    return {
+        "chunks": chunk_count,
+        "embeddings_generated": True,
+        "model": "all-MiniLM-L6-v2",
+        "dtype": "int8",
+        "chunk_size": chunk_size,
+        "text_length": len(text),
+        "text_digest": text_digest(text),
+        "total_embeddings": chunk_count
+    }
+
+def _has_current_embeddings(document: Optional[Document], text: str, chunk_size: int) -> bool:
+    """True when the stored embeddings already cover this text at this chunk size"""
+    metadata = document.embedding_metadata if document else None
+    return bool(
+        metadata
+        and metadata.get("embeddings_generated")
+        and metadata.get("chunk_size") == chunk_size
+        # Digest guards against a document re-extracted with different content
+        and metadata.get("text_digest") == text_digest(text)
+    )
+
+async def _upload_document(document_id: str, pdf_bytes: bytes) -> Optional[str]:
+    """Step 2: upload to S3 (if configured); returns the key on success"""
+    try:
+        logger.info(f"Uploading document to S3")
+        s3_key = f"documents/{document_id}.pdf"
+        if await storage_service.upload_bytes(pdf_bytes, s3_key):
+            return s3_key
+        
+    except Exception as e:
+        logger.warning(f"S3 upload failed (continuing without S3): {e}")
+    
+    return None
+
+def iter_embedding_records(chunks: List[Dict], embeddings: np.ndarray, document_id: str) -> Iterator[Dict]:
+    """Yield one vector_embeddings row per chunk without materializing them all at once"""
+    # int8 storage is 4x smaller than float32; quantize the whole matrix at once
+    quantized, scales = quantize_embeddings(embeddings)
+    for i, chunk in enumerate(chunks[:len(quantized)]):
+        yield {
+            "document_id": document_id,
+            "chunk_index": i,
+            "chunk_text": chunk["text"],
+            "embedding": quantized[i].tobytes(),
+            "embedding_scale": float(scales[i])
+        }
+
+async def _embed_document(db: Session, document_id: str, text: str) -> int:
+    """Step 3: generate embeddings for semantic search; returns the chunk count, 0 on failure"""
+    if not text:
+        return 0
+    
+    try:
+        # Reprocessing unchanged text keeps the embeddings already stored
+        document = await document_service.get_document(db, document_id)
+        if _has_current_embeddings(document, text, EMBED_CHUNK_SIZE):
+            logger.info(f"Embeddings for document {document_id} are up to date, skipping")
+            return document.embedding_metadata["chunks"]
+        
+        # Split text into chunks for embedding
+        chunks = await pdf_service.get_or_cache_chunks(
+            document_id, 
+            text, 
+            chunk_size=EMBED_CHUNK_SIZE, 
+            overlap=100
+        )
+        
+        # Generate embeddings for chunks
+        chunk_texts = [chunk["text"] for chunk in chunks]
+        embeddings = await _embed_in_batches(chunk_texts)
+        
+        # Stream rows straight into multi-row INSERTs
+        stored = await document_service.replace_document_embeddings(
+            db, document_id, iter_embedding_records(chunks, embeddings, document_id)
+        )
+        
+        logger.info(f"Generated embeddings for {len(chunks)} chunks")
+        return stored
+        
+    except Exception as e:
+        logger.error(f"Embedding generation failed: {e}")
+        # Continue without embeddings
+        return 0
 
 @celery_app.task(bind=True, name='app.tasks.process_document_task')
 def process_document_task(self, document_id: str, file_path: str):
@@ -35,102 +200,56 @@ def process_document_task(self, document_id: str, file_path: str):
     - Generate embeddings
     - Update document status
     """
-    db = SessionLocal()
+    return run_async(_process_document(document_id, file_path))
+
+async def _process_document(document_id: str, file_path: str):
+    db = TaskSession()
     
     try:
         logger.info(f"Starting document processing for document {document_id}")
         
         # Update status to processing
-        asyncio.run(document_service.update_processing_status(
+        await document_service.update_processing_status(
             db, document_id, "processing", "text_extraction", 10
-        ))
+        )
         
         # Step 1: Extract text from PDF
         logger.info(f"Extracting text from PDF: {file_path}")
-        extraction_result = asyncio.run(pdf_service.extract_text_from_pdf(file_path))
+        # Read and parse the file once for this run; the S3 upload reuses the same bytes
+        async with pdf_service.reader(file_path) as reader:
+            extraction_result = await pdf_service.extract_text_from_pdf(file_path, reader)
+            pdf_bytes = pdf_service.read_pdf_bytes(file_path, reader)
         
         if not extraction_result["success"]:
             raise Exception(f"PDF text extraction failed: {extraction_result['error']}")
         
-        # Update document with extracted text
-        asyncio.run(document_service.set_text_content(
-            db, 
-            document_id, 
-            extraction_result["text"], 
-            extraction_result["page_count"]
-        ))
-        
-        # Update progress
-        asyncio.run(document_service.update_processing_status(
-            db, document_id, "processing", "text_processing", 40
-        ))
+        # Update document with extracted text and progress in one write
+        await document_service.bulk_update(db, document_id, {
+            "text_content": extraction_result["text"],
+            "page_count": extraction_result["page_count"],
+            "processing_stage": "generating_embeddings",
+            "processing_progress": 70
+        })
+        
+        # Steps 2 and 3: S3 upload is network-bound, so overlap it with embedding generation
+        s3_key, embedded_chunks = await asyncio.gather(
+            _upload_document(document_id, pdf_bytes),
+            _embed_document(db, document_id, extraction_result["text"])
+        )
         
-        # Step 2: Upload to S3 (if configured)
-        try:
-            logger.info(f"Uploading document to S3")
-            s3_key = f"documents/{document_id}.pdf"
-            s3_url = storage_service.upload_file(file_path, s3_key)
-            
-            # Update document with S3 info
-            from app.schemas import DocumentUpdate
-            updates = DocumentUpdate(s3_key=s3_key, s3_url=s3_url)
-            asyncio.run(document_service.update_document(db, document_id, updates))
-            
-        except Exception as e:
-            logger.warning(f"S3 upload failed (continuing without S3): {e}")
-        
-        # Update progress
-        asyncio.run(document_service.update_processing_status(
-            db, document_id, "processing", "generating_embeddings", 70
-        ))
-        
-        # Step 3: Generate embeddings for semantic search
-        if extraction_result["text"]:
-            try:
-                # Split text into chunks for embedding
-                chunks = pdf_service.get_text_chunks(
-                    extraction_result["text"], 
-                    chunk_size=1000, 
-                    overlap=100
-                )
-                
-                # Generate embeddings for chunks
-                chunk_texts = [chunk["text"] for chunk in chunks]
-                embeddings = asyncio.run(ai_service.generate_embeddings(chunk_texts))
-                
-                # Store embeddings (in production, this would go to Pinecone)
-                # For now, we'll store them in the document metadata
-                embedding_data = [
-                    {
-                        "chunk_index": i,
-                        "text": chunk["text"],
-                        "embedding": embedding,
-                        "word_count": chunk["word_count"]
-                    }
-                    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
-                ]
-                
-                # Update document with embedding metadata
-                from app.schemas import DocumentUpdate
-                updates = DocumentUpdate(
-                    embedding_metadata={
-                        "chunks": len(chunks),
-                        "embeddings_generated": True,
-                        "model": "text-embedding-ada-002"
-                    }
-                )
-                asyncio.run(document_service.update_document(db, document_id, updates))
-                
-                logger.info(f"Generated embeddings for {len(chunks)} chunks")
-                
-            except Exception as e:
-                logger.error(f"Embedding generation failed: {e}")
-                # Continue without embeddings
-        
-        # Step 4: Final status update
-        asyncio.run(document_service.update_processing_status(
-            db, document_id, "completed", "completed", 100
-        ))
+        # Step 4: Final status update, together with what both steps produced
+        final_fields = {
+            "status": "completed",
+            "processing_stage": "completed",
+            "processing_progress": 100
+        }
+        if s3_key:
+            final_fields["s3_key"] = s3_key
+        if embedded_chunks:
+            final_fields["embedding_metadata"] = _embedding_metadata(
+                extraction_result["text"], EMBED_CHUNK_SIZE, embedded_chunks
+            )
+        await document_service.bulk_update(db, document_id, final_fields)
         
         logger.info(f"Document processing completed for document {document_id}")
         
@@ -139,7 +258,8 @@ def process_document_task(self, document_id: str, file_path: str):
             "document_id": document_id,
             "text_length": len(extraction_result["text"]),
             "page_count": extraction_result["page_count"],
-            "word_count": extraction_result["word_count"]
+            "word_count": extraction_result["word_count"],
+            "embedded_chunks": embedded_chunks
         }
         
     except Exception as e:
@@ -147,33 +267,33 @@ def process_document_task(self, document_id: str, file_path: str):
         logger.error(traceback.format_exc())
         
         # Update status to error
-        asyncio.run(document_service.update_processing_status(
+        await document_service.update_processing_status(
             db, 
             document_id, 
             "error", 
             "error", 
             0, 
             error_message=str(e)
-        ))
+        )
         
         # Re-raise the exception to mark task as failed
         raise e
-        
-    finally:
-        db.close()
 
 @celery_app.task(bind=True, name='app.tasks.generate_summary_task')
 def generate_summary_task(self, document_id: str):
     """
     Background task to generate AI summary for a document
     """
-    db = SessionLocal()
+    return run_async(_generate_summary(document_id))
+
+async def _generate_summary(document_id: str):
+    db = TaskSession()
     
     try:
         logger.info(f"Starting summary generation for document {document_id}")
         
         # Get document
-        document = document_service.get_document(db, document_id)
+        document = await document_service.get_document(db, document_id)
         if not document:
             raise Exception(f"Document {document_id} not found")
         
@@ -181,7 +301,7 @@ def generate_summary_task(self, document_id: str):
             raise Exception(f"Document {document_id} has no text content")
         
         # Check if summary already exists
-        existing_summary = summary_service.get_summary_by_document_id(db, document_id)
+        existing_summary = await summary_service.get_summary_by_document_id(db, document_id)
         if existing_summary:
             logger.info(f"Summary already exists for document {document_id}")
             return {
@@ -192,14 +312,14 @@ def generate_summary_task(self, document_id: str):
         # Generate AI summary
         logger.info(f"Generating AI summary for document: {document.original_name}")
         
-        summary_result = ai_service.generate_summary(
+        summary_result = await ai_service.generate_summary(
             text=document.text_content,
             document_name=document.original_name,
             max_summary_length=500
         )
         
         # Extract highlights
-        highlights = ai_service.extract_highlights(
+        highlights = await ai_service.extract_highlights(
             text=document.text_content,
             summary=summary_result["summary"]
         )
@@ -213,7 +333,7 @@ def generate_summary_task(self, document_id: str):
             processing_time=None  # Could be calculated if needed
         )
         
-        summary = summary_service.create_summary(db, summary_data)
+        summary = await summary_service.create_summary(db, summary_data)
         
         logger.info(f"Summary generated successfully for document {document_id}")
         
@@ -232,9 +352,6 @@ def generate_summary_task(self, document_id: str):
         
         # Re-raise the exception to mark task as failed
         raise e
-        
-    finally:
-        db.close()
 
 @celery_app.task(bind=True, name='app.tasks.generate_embeddings_task')
 def generate_embeddings_task(self, document_id: str, chunk_size: int = 1000):
@@ -242,21 +359,38 @@ def generate_embeddings_task(self, document_id: str, chunk_size: int = 1000):
     Background task to generate embeddings for document chunks
     Used for semantic search capabilities
     """
-    db = SessionLocal()
+    return run_async(_generate_embeddings(document_id, chunk_size))
+
+async def _generate_embeddings(document_id: str, chunk_size: int = 1000):
+    db = TaskSession()
     
     try:
         logger.info(f"Starting embedding generation for document {document_id}")
         
         # Get document
-        document = document_service.get_document(db, document_id)
+        document = await document_service.get_document(db, document_id)
         if not document:
             raise Exception(f"Document {document_id} not found")
         
         if not document.text_content:
             raise Exception(f"Document {document_id} has no text content")
         
+        # Duplicate invocations cost a single read
+        if _has_current_embeddings(document, document.text_content, chunk_size):
+            metadata = document.embedding_metadata
+            logger.info(f"Embeddings for document {document_id} already exist, skipping")
+            return {
+                "status": "exists",
+                "document_id": document_id,
+                "chunks_processed": metadata["chunks"],
+                "embeddings_generated": metadata["total_embeddings"],
+                "model": metadata["model"],
+                "dtype": metadata["dtype"]
+            }
+        
         # Split text into chunks
-        chunks = pdf_service.get_text_chunks(
+        chunks = await pdf_service.get_or_cache_chunks(
+            document_id, 
             document.text_content, 
             chunk_size=chunk_size, 
             overlap=100
@@ -266,34 +400,19 @@ def generate_embeddings_task(self, document_id: str, chunk_size: int = 1000):
         
         # Generate embeddings
         chunk_texts = [chunk["text"] for chunk in chunks]
-        embeddings = ai_service.generate_embeddings(chunk_texts)
+        embeddings = await _embed_in_batches(chunk_texts)
         
-        # Prepare embedding data
-        embedding_data = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            embedding_data.append({
-                "document_id": document_id,
-                "chunk_index": i,
-                "text": chunk["text"],
-                "embedding": embedding,
-                "word_count": chunk["word_count"],
-                "start_word": chunk["start_word"],
-                "end_word": chunk["end_word"]
-            })
-        
-        # In production, store embeddings in Pinecone or similar vector database
-        # For now, we'll update the document with embedding metadata
+        # Store embeddings, replacing any from a previous run
+        await document_service.replace_document_embeddings(
+            db, document_id, iter_embedding_records(chunks, embeddings, document_id)
+        )
+        
+        # Update the document with embedding metadata
         from app.schemas import DocumentUpdate
         updates = DocumentUpdate(
-            embedding_metadata={
-                "chunks": len(chunks),
-                "embeddings_generated": True,
-                "model": "text-embedding-ada-002",
-                "chunk_size": chunk_size,
-                "total_embeddings": len(embeddings)
-            }
+            embedding_metadata=_embedding_metadata(document.text_content, chunk_size, len(embeddings))
         )
-        document_service.update_document(db, document_id, updates)
+        await document_service.update_document(db, document_id, updates)
         
         logger.info(f"Generated {len(embeddings)} embeddings for document {document_id}")
         
@@ -302,7 +421,8 @@ def generate_embeddings_task(self, document_id: str, chunk_size: int = 1000):
             "document_id": document_id,
             "chunks_processed": len(chunks),
             "embeddings_generated": len(embeddings),
-            "model": "text-embedding-ada-002"
+            "model": "all-MiniLM-L6-v2",
+            "dtype": "int8"
         }
         
     except Exception as e:
@@ -311,16 +431,17 @@ def generate_embeddings_task(self, document_id: str, chunk_size: int = 1000):
         
         # Re-raise the exception to mark task as failed
         raise e
-        
-    finally:
-        db.close()
 
 @celery_app.task(bind=True, name='app.tasks.cleanup_failed_documents')
 def cleanup_failed_documents(self):
     """
     Periodic task to clean up documents that failed processing
+    Fans the work out to cleanup_failed_documents_batch subtasks
     """
-    db = SessionLocal()
+    return run_async(_cleanup_failed_documents())
+
+async def _cleanup_failed_documents():
+    db = TaskSession()
     
     try:
         logger.info("Starting cleanup of failed documents")
@@ -329,49 +450,65 @@ def cleanup_failed_documents(self):
         from datetime import datetime, timedelta
         cutoff_time = datetime.utcnow() - timedelta(hours=1)
         
-        failed_documents = db.query(Document).filter(
-            and_(
-                Document.status == "error",
-                Document.updated_at < cutoff_time
-            )
-        ).all()
+        failed_ids = db.execute(FAILED_DOCUMENTS_STMT, {"cutoff": cutoff_time}).scalars().all()
         
-        cleaned_count = 0
-        for document in failed_documents:
-            try:
-                # Delete the document (this will also clean up files)
-                success = document_service.delete_document(db, document.id)
-                if success:
-                    cleaned_count += 1
-                    logger.info(f"Cleaned up failed document: {document.id}")
-            except Exception as e:
-                logger.error(f"Failed to clean up document {document.id}: {e}")
+        # One subtask per batch so workers delete in parallel, each in a single transaction
+        batches = [
+            failed_ids[start:start + CLEANUP_BATCH_SIZE]
+            for start in range(0, len(failed_ids), CLEANUP_BATCH_SIZE)
+        ]
+        if batches:
+            group(cleanup_failed_documents_batch.s(batch) for batch in batches).apply_async()
         
-        logger.info(f"Cleanup completed. Removed {cleaned_count} failed documents")
+        logger.info(f"Cleanup dispatched {len(failed_ids)} failed documents in {len(batches)} batches")
         
         return {
             "status": "success",
-            "cleaned_documents": cleaned_count
+            "failed_documents": len(failed_ids),
+            "batches": len(batches)
         }
         
     except Exception as e:
         logger.error(f"Cleanup task failed: {str(e)}")
         raise e
+
+@celery_app.task(bind=True, name='app.tasks.cleanup_failed_documents_batch')
+def cleanup_failed_documents_batch(self, document_ids: List[str]):
+    """
+    Delete one batch of failed documents and their files
+    """
+    return run_async(_cleanup_failed_documents_batch(document_ids))
+
+async def _cleanup_failed_documents_batch(document_ids: List[str]):
+    db = TaskSession()
+    
+    try:
+        cleaned_count = await document_service.delete_documents(db, document_ids)
+        logger.info(f"Cleanup batch removed {cleaned_count} failed documents")
+        
+        return {
+            "status": "success",
+            "cleaned_documents": cleaned_count
+        }
         
-    finally:
-        db.close()
+    except Exception as e:
+        logger.error(f"Cleanup batch failed: {str(e)}")
+        raise e
 
 @celery_app.task(bind=True, name='app.tasks.update_document_stats')
 def update_document_stats(self):
     """
     Periodic task to update document processing statistics
     """
-    db = SessionLocal()
+    return run_async(_update_document_stats())
+
+async def _update_document_stats():
+    db = TaskSession()
     
     try:
         logger.info("Updating document processing statistics")
         
-        stats = document_service.get_processing_stats(db)
+        stats = await document_service.get_processing_stats(db)
         
         # In production, you might store these stats in Redis or a monitoring system
         logger.info(f"Document stats: {stats}")
@@ -384,6 +521,3 @@ def update_document_stats(self):
     except Exception as e:
         logger.error(f"Stats update task failed: {str(e)}")
         raise e
-        
-    finally:
-        db.close()
@@ -2,39 +2,64 @@ from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Backgroun
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 import os
 from typing import List, Optional
 import uuid
-import aiofiles
 import logging
+import shutil
+import time
 from pathlib import Path
 
-from app.database import get_db, engine
+from app.database import get_db, get_engine, SessionLocal
 from app.models import Base
+from app.migrations import upgrade_schema
 from app.schemas import (
     DocumentResponse, 
     DocumentCreate, 
+    DocumentMatchResponse, 
+    SummaryCreate, 
     SummaryResponse,
     PaginatedResponse,
     ProcessingStatusResponse
 )
-from app.services.document_service import DocumentService
-from app.services.summary_service import SummaryService
-from app.services.storage_service import StorageService
+from app.services.ai_service import AIService, get_ai_service
+from app.services.document_service import get_document_service
+from app.services.pdf_service import get_pdf_service
+from app.services.summary_service import SummaryService, get_summary_service
+from app.services.storage_service import get_storage_service
 from app.config import settings
 from app.celery_app import celery_app
+from app.logging_config import setup_logging
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Configure logging
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup work that shouldn't run at import time"""
+    # Queue log records so handler I/O stays off the request path
+    setup_logging()
+    
+    # Create database tables, then upgrade tables that predate the current models
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    
+    # Open the Groq connection pool before the first summary request needs it
+    await ai_service.warm_up()
+    
+    yield
+    
+    await storage_service.close()
+    pdf_service.shutdown()
+
 app = FastAPI(
     title="Document Summarizer AI",
     description="AI-powered document analysis and summarization platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -53,14 +78,23 @@ app.add_middleware(
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_upload(source, file_path: Path) -> int:
+    """Copy an upload to disk within one worker thread; returns bytes written"""
+    with open(file_path, 'wb') as f:
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+        return f.tell()
 
 # Mount static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Initialize services
-document_service = DocumentService()
-summary_service = SummaryService()
-storage_service = StorageService()
+document_service = get_document_service()
+summary_service = get_summary_service()
+pdf_service = get_pdf_service()
+ai_service = get_ai_service()
+storage_service = get_storage_service()
 
 @app.get("/")
 async def root():
@@ -98,16 +132,14 @@ async def upload_document(
         filename = f"{file_id}{file_extension}"
         file_path = UPLOAD_DIR / filename
         
-        # Save file to disk
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        # Stream file to disk in 1MB chunks instead of buffering the whole upload
+        file_size = await run_in_threadpool(save_upload, file.file, file_path)
         
         # Create document record
         document_data = DocumentCreate(
             filename=filename,
             original_name=file.filename,
-            file_size=len(content),
+            file_size=file_size,
             file_path=str(file_path)
         )
         
@@ -116,7 +148,7 @@ async def upload_document(
         # Start background processing
         background_tasks.add_task(process_document_background, document.id, str(file_path))
         
-        return DocumentResponse.from_orm(document)
+        return DocumentResponse.model_validate(document)
         
     except Exception as e:
         # Clean up file if document creation failed
@@ -134,7 +166,7 @@ async def get_documents(
     documents, total = await document_service.get_documents(db, page, page_size)
     
     return PaginatedResponse(
-        items=[DocumentResponse.from_orm(doc) for doc in documents],
+        items=[DocumentResponse.model_validate(doc) for doc in documents],
         total=total,
         page=page,
         page_size=page_size,
@@ -148,7 +180,7 @@ async def get_document(document_id: str, db: Session = Depends(get_db)):
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return DocumentResponse.from_orm(document)
+    return DocumentResponse.model_validate(document)
 
 @app.delete("/api/documents/{document_id}")
 async def delete_document(document_id: str, db: Session = Depends(get_db)):
@@ -195,18 +227,11 @@ async def get_processing_status(document_id: str, db: Session = Depends(get_db))
 @app.post("/api/documents/{document_id}/summarize", response_model=SummaryResponse)
 async def generate_summary(
     document_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+    summary_service: SummaryService = Depends(get_summary_service)
 ):
     """Generate AI summary for document"""
-    # Import services at the beginning
-    from app.services.ai_service import AIService
-    from app.services.summary_service import SummaryService
-    from app.schemas import SummaryCreate
-    import time
-    
-    ai_service = AIService()
-    summary_service = SummaryService()
-    
     document = await document_service.get_document(db, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -217,7 +242,7 @@ async def generate_summary(
     # Check if summary already exists
     existing_summary = await summary_service.get_summary_by_document_id(db, document_id)
     if existing_summary:
-        return SummaryResponse.from_orm(existing_summary)
+        return SummaryResponse.model_validate(existing_summary)
     
     # Generate summary directly (synchronously)
     try:
@@ -247,7 +272,7 @@ async def generate_summary(
         new_summary = await summary_service.create_summary(db, summary_data)
         logger.info(f"Summary saved for document {document_id}")
         
-        return SummaryResponse.from_orm(new_summary)
+        return SummaryResponse.model_validate(new_summary)
         
     except Exception as e:
         logger.error(f"Summary generation failed for {document_id}: {str(e)}")
@@ -260,7 +285,7 @@ async def get_summary(document_id: str, db: Session = Depends(get_db)):
     if not summary:
         raise HTTPException(status_code=404, detail="Summary not found")
     
-    return SummaryResponse.from_orm(summary)
+    return SummaryResponse.model_validate(summary)
 
 # Search endpoints
 @app.get("/api/search")
@@ -276,14 +301,14 @@ async def search_documents(
     documents, total = await document_service.search_documents(db, q, page, page_size)
     
     return PaginatedResponse(
-        items=[DocumentResponse.from_orm(doc) for doc in documents],
+        items=[DocumentResponse.model_validate(doc) for doc in documents],
         total=total,
         page=page,
         page_size=page_size,
         total_pages=(total + page_size - 1) // page_size
     )
 
-@app.get("/api/documents/{document_id}/search")
+@app.get("/api/documents/{document_id}/search", response_model=DocumentMatchResponse)
 async def search_in_document(
     document_id: str,
     q: str,
@@ -315,58 +340,43 @@ async def manually_process_document(
     
     return {"message": "Processing started", "document_id": document_id}
 
-def generate_summary_background(document_id: str):
+async def generate_summary_background(document_id: str):
     """Background task to generate summary for document"""
     logger.info(f"Starting summary generation for document {document_id}")
     try:
-        from app.services.ai_service import AIService
-        from app.services.summary_service import SummaryService
-        from app.database import SessionLocal
-        from app.schemas import SummaryCreate
-        import time
-        
-        ai_service = AIService()
-        summary_service = SummaryService()
-        
         # Create new database session for background task
         db = SessionLocal()
         
         try:
-            import asyncio
+            # Get document
+            document = await document_service.get_document(db, document_id)
+            if not document or not document.text_content:
+                raise Exception("Document not found or has no text content")
             
-            async def async_generate_summary():
-                # Get document
-                document = await document_service.get_document(db, document_id)
-                if not document or not document.text_content:
-                    raise Exception("Document not found or has no text content")
-                
-                logger.info(f"Generating summary for document: {document.original_name}")
-                start_time = time.time()
-                
-                # Generate AI summary using Groq
-                summary_result = await ai_service.generate_summary(
-                    document.text_content, 
-                    document.original_name,
-                    max_summary_length=500
-                )
-                
-                processing_time = time.time() - start_time
-                logger.info(f"Summary generated in {processing_time:.2f} seconds")
-                
-                # Save summary to database
-                summary_data = SummaryCreate(
-                    document_id=document_id,
-                    content=summary_result["summary"],
-                    key_points=summary_result.get("key_points", []),
-                    processing_time=processing_time,
-                    model_used=summary_result.get("model", "llama-3.3-70b-versatile")
-                )
-                
-                await summary_service.create_summary(db, summary_data)
-                logger.info(f"Summary saved for document {document_id}")
+            logger.info(f"Generating summary for document: {document.original_name}")
+            start_time = time.time()
+            
+            # Generate AI summary using Groq
+            summary_result = await ai_service.generate_summary(
+                document.text_content, 
+                document.original_name,
+                max_summary_length=500
+            )
             
-            # Run the async function
-            asyncio.run(async_generate_summary())
+            processing_time = time.time() - start_time
+            logger.info(f"Summary generated in {processing_time:.2f} seconds")
+            
+            # Save summary to database
+            summary_data = SummaryCreate(
+                document_id=document_id,
+                content=summary_result["summary"],
+                key_points=summary_result.get("key_points", []),
+                processing_time=processing_time,
+                model_used=summary_result.get("model", "llama-3.3-70b-versatile")
+            )
+            
+            await summary_service.create_summary(db, summary_data)
+            logger.info(f"Summary saved for document {document_id}")
             
         finally:
             db.close()
@@ -379,13 +389,6 @@ async def process_document_background(document_id: str, file_path: str):
     logger.info(f"Starting background processing for document {document_id}")
     try:
         # Simple processing without Celery for development
-        from app.services.pdf_service import PDFService
-        from app.services.ai_service import AIService
-        from app.database import SessionLocal
-        
-        pdf_service = PDFService()
-        ai_service = AIService()
-        
         # Create new database session for background task
         db = SessionLocal()
         
@@ -395,23 +398,28 @@ async def process_document_background(document_id: str, file_path: str):
                 db, document_id, "processing", "text-extraction", 25
             )
             
-            # Extract text from PDF
-            pdf_result = await pdf_service.extract_text_from_pdf(file_path)
+            # Validate and extract against a single parsed reader
+            async with pdf_service.reader(file_path) as reader:
+                validation = await pdf_service.validate_pdf(file_path, reader)
+                if not validation.get('valid'):
+                    raise Exception(f"Invalid PDF: {validation.get('error', 'Unknown error')}")
+                
+                pdf_result = await pdf_service.extract_text_from_pdf(file_path, reader)
+            
             if not pdf_result.get('success'):
                 raise Exception(f"PDF extraction failed: {pdf_result.get('error', 'Unknown error')}")
             
             text_content = pdf_result.get('text', '')
             page_count = pdf_result.get('page_count', 0)
             
-            # Update document with extracted content
-            await document_service.set_text_content(
-                db, document_id, text_content, page_count
-            )
-            
-            # Update status to completed
-            await document_service.update_processing_status(
-                db, document_id, "completed", "completed", 100
-            )
+            # Update document with extracted content and mark it completed in one write
+            await document_service.bulk_update(db, document_id, {
+                "text_content": text_content,
+                "page_count": page_count,
+                "status": "completed",
+                "processing_stage": "completed",
+                "processing_progress": 100
+            })
             
         finally:
             db.close()
@@ -0,0 +1,55 @@
+import asyncio
+
+import numpy as np
+
+from app import tasks
+
+
+class FakeEncoder:
+    """Stands in for SentenceTransformer.encode and records each batch it is given"""
+
+    max_seq_length = 256
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.batches.append(len(texts))
+        return np.ones((len(texts), 384), dtype=np.float32)
+
+
+def test_full_size_chunks_fill_a_batch(monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setattr(tasks.ai_service, "embedding_model", encoder)
+    # 1000-word chunks are far longer than the encoder keeps
+    texts = [" ".join(["word"] * tasks.EMBED_CHUNK_SIZE)] * 64
+    
+    embeddings = asyncio.run(tasks._embed_in_batches(texts))
+    
+    assert encoder.batches == [32, 32]
+    assert embeddings.shape == (64, 384)
+
+
+class OutOfMemoryEncoder(FakeEncoder):
+    """Raises MemoryError for any batch larger than max_batch"""
+
+    def __init__(self, max_batch):
+        super().__init__()
+        self.max_batch = max_batch
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if len(texts) > self.max_batch:
+            raise MemoryError()
+        return super().encode(texts, batch_size=batch_size, **kwargs)
+
+
+def test_memory_error_halves_the_batch(monkeypatch):
+    encoder = OutOfMemoryEncoder(max_batch=8)
+    monkeypatch.setattr(tasks.ai_service, "embedding_model", encoder)
+    texts = [f"chunk {i}" for i in range(32)]
+    
+    embeddings = asyncio.run(tasks._embed_in_batches(texts))
+    
+    # 32 -> 16 -> 8 after two out-of-memory failures
+    assert encoder.batches == [8, 8, 8, 8]
+    assert embeddings.shape == (32, 384)